@@ -1,3 +1,4 @@
+import os
 import warnings
 from pathlib import Path
 
@@ -95,10 +96,10 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.OrderingFilter",
-        'rest_framework.filters.SearchFilter',
+        'common.filters.SearchFilter',
     ),
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "common.renderers.IncrementalJSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ],
     "DEFAULT_THROTTLE_RATES": {
@@ -114,11 +115,39 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 200,
 }
 
+# Model versions, cached responses and totals, compiled permissions and task
+# progress snapshots are invalidated by whichever process writes, web or
+# Celery worker, so they need a cache every process shares. server.py starts
+# Redis and sets REDIS_URL; without it each process gets its own
+# local-memory cache and those features fall back to their uncached paths.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+
+# Celery tasks publish progress to WebSocket subscribers through this layer,
+# and snapshots for the status action through the shared cache. Workers run
+# in their own processes, so the in-memory layer never reaches the ASGI
+# server: without REDIS_URL pushes and snapshots are off and clients poll
+# the status action, which asks the result backend.
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels.layers.InMemoryChannelLayer",
     },
 }
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        },
+    }
+    CELERY_BROKER_URL = REDIS_URL
+    CELERY_RESULT_BACKEND = REDIS_URL
 
 TEMPLATES = [
     {
@@ -188,3 +217,10 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Fields whose icontains search is answered from a trigram index. Migration
+# 0005 indexes the rows of the fields listed here; after adding a field, run
+# `manage.py rebuild_trigram_index` before relying on it.
+TRIGRAM_FIELDS = {
+    "djauth.user": ["email", "username", "first_name", "last_name"],
+}
@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class CommonConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "common"
+
+    def ready(self):
+        from common.registry import model_registry
+        from common.signals import (
+            connect_count_signals,
+            connect_permission_signals,
+            connect_search_signals,
+            connect_trigram_signals,
+            connect_version_signals,
+        )
+
+        model_registry.build()
+        connect_permission_signals()
+        connect_search_signals()
+        connect_trigram_signals()
+        connect_version_signals()
+        connect_count_signals()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.http import quote_etag
+
+RESPONSE_CACHE_ALIAS = getattr(settings, "RESPONSE_CACHE_ALIAS", "default")
+RESPONSE_CACHE_TIMEOUT = getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+# None caches responses only when the cache is shared (see is_shared_cache).
+RESPONSE_CACHE_ENABLED = getattr(settings, "RESPONSE_CACHE_ENABLED", None)
+
+
+def is_shared_cache(alias=RESPONSE_CACHE_ALIAS):
+    """
+    Whether every process, web and Celery worker alike, sees the cache
+    ``alias``. Versions and generations are bumped by whichever process
+    writes, so a process-local cache never hears of other processes' writes.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def is_response_cache_enabled():
+    if RESPONSE_CACHE_ENABLED is not None:
+        return RESPONSE_CACHE_ENABLED
+    return is_shared_cache()
+
+
+def get_version_key(model):
+    return f"model-version:{model._meta.concrete_model._meta.label_lower}"
+
+
+def get_model_versions(models):
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    keys = [get_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, None)
+            versions[key] = cache.get(key, 1)
+    return [versions[key] for key in keys]
+
+
+def bump_model_version(model, using=None):
+    """
+    Invalidates every cached response that depends on ``model``. The bump
+    happens once the current transaction commits, so a page rendered from
+    uncommitted rows is never cached under the new version.
+    """
+    key = get_version_key(model)
+
+    def bump():
+        cache = caches[RESPONSE_CACHE_ALIAS]
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+
+    transaction.on_commit(bump, using=using)
+
+
+def get_normalized_params(request):
+    return sorted(
+        (name, sorted(values)) for name, values in request.query_params.lists()
+    )
+
+
+def make_etag(*parts):
+    payload = json.dumps(parts, default=str, separators=(",", ":"))
+    return quote_etag(hashlib.md5(payload.encode()).hexdigest())
+
+
+def get_response_cache_key(request, action, models, scope):
+    """
+    Builds the key for a cached list/retrieve payload from the request path
+    and host, the normalised query params, the versions of every model the
+    response renders and the caller's permission scope.
+    """
+    payload = json.dumps(
+        [
+            request.get_host(),
+            request.path,
+            action,
+            get_normalized_params(request),
+            get_model_versions(models),
+            scope,
+        ],
+        separators=(",", ":"),
+    )
+    return f"response:{hashlib.md5(payload.encode()).hexdigest()}"
+
+
+def get_cached_response_data(key):
+    return caches[RESPONSE_CACHE_ALIAS].get(key)
+
+
+def set_cached_response_data(key, data):
+    caches[RESPONSE_CACHE_ALIAS].set(key, data, RESPONSE_CACHE_TIMEOUT)
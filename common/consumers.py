@@ -0,0 +1,52 @@
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from common.progress import (
+    FINAL_STATES,
+    PUSH_UNAVAILABLE_CODE,
+    get_push_layer,
+    get_task_group,
+    get_task_snapshot,
+)
+
+
+class TaskProgressConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes the events of one import, export or delete task to the client:
+    the latest snapshot on connect, then progress and a final SUCCESS or
+    FAILURE event, after which the socket is closed. Without a channel
+    layer shared with the workers nothing would arrive, so the socket is
+    closed with PUSH_UNAVAILABLE_CODE and clients poll the status action.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        if get_push_layer() is None:
+            await self.accept()
+            await self.close(code=PUSH_UNAVAILABLE_CODE)
+            return
+        self.task_id = self.scope["url_route"]["kwargs"]["task_id"]
+        self.group_name = get_task_group(self.task_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        snapshot = await sync_to_async(get_task_snapshot)(self.task_id)
+        if snapshot is not None:
+            await self.task_event({"event": snapshot})
+
+    async def disconnect(self, code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # The stream is one-way.
+        pass
+
+    async def task_event(self, message):
+        event = message["event"]
+        await self.send_json(event)
+        if event["status"] in FINAL_STATES:
+            await self.close()
@@ -0,0 +1,217 @@
+import hashlib
+import json
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections, transaction
+from django.utils.functional import cached_property
+
+from common.cache import RESPONSE_CACHE_ALIAS, get_model_versions, is_shared_cache
+
+COUNT_STRATEGY = getattr(settings, "COUNT_STRATEGY", "cached")
+COUNT_CACHE_TIMEOUT = getattr(settings, "COUNT_CACHE_TIMEOUT", 60)
+# Estimates below this are replaced by an exact count, which is cheap there.
+COUNT_ESTIMATE_THRESHOLD = getattr(settings, "COUNT_ESTIMATE_THRESHOLD", 100000)
+
+
+def is_unfiltered(queryset):
+    query = queryset.query
+    return not query.where and not query.distinct and not query.is_sliced
+
+
+def get_total_key(model):
+    return f"count:{model._meta.concrete_model._meta.label_lower}"
+
+
+def get_query_models(queryset):
+    tables = {
+        table.table_name
+        for table in queryset.query.alias_map.values()
+        if hasattr(table, "table_name")
+    }
+    return [model for model in apps.get_models() if model._meta.db_table in tables]
+
+
+def adjust_total_count(model, delta, using=None):
+    """Applies a row-count delta to the cached total once the write commits."""
+    key = get_total_key(model)
+
+    def adjust():
+        try:
+            caches[RESPONSE_CACHE_ALIAS].incr(key, delta)
+        except ValueError:
+            pass
+
+    transaction.on_commit(adjust, using=using)
+
+
+def invalidate_total_count(model, using=None):
+    key = get_total_key(model)
+    transaction.on_commit(lambda: caches[RESPONSE_CACHE_ALIAS].delete(key), using=using)
+
+
+class CountProvider:
+    """
+    Counts the rows of a queryset for pagination and metadata. ``count``
+    returns None when the strategy does not produce a total.
+    """
+
+    def count(self, queryset):
+        raise NotImplementedError
+
+
+class ExactCountProvider(CountProvider):
+    def count(self, queryset):
+        return queryset.count()
+
+
+class CachedCountProvider(CountProvider):
+    """
+    Exact counts cached for COUNT_CACHE_TIMEOUT seconds. Unfiltered totals
+    are kept current between refreshes by post_save/post_delete deltas;
+    filtered counts are keyed by the versions of the models they read.
+    Without a shared cache, writes made by other processes would not reach
+    the cached counts, so every count is exact.
+    """
+
+    def count(self, queryset):
+        if not is_shared_cache():
+            return queryset.count()
+        cache = caches[RESPONSE_CACHE_ALIAS]
+        key = self.get_key(queryset)
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.add(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_key(self, queryset):
+        if is_unfiltered(queryset):
+            return get_total_key(queryset.model)
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+        payload = json.dumps(
+            [queryset.db, sql, params, get_model_versions(get_query_models(queryset))],
+            default=str,
+        )
+        return f"count:{hashlib.md5(payload.encode()).hexdigest()}"
+
+
+class EstimatedCountProvider(CountProvider):
+    """
+    Row estimates from the database: table statistics for unfiltered
+    querysets and the planner's estimate for filtered ones (PostgreSQL
+    only). Small or unknown estimates fall back to ``fallback``.
+    """
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or CachedCountProvider()
+
+    def count(self, queryset):
+        try:
+            estimate = self.estimate(queryset)
+        except DatabaseError:
+            estimate = None
+        if estimate is None or estimate < COUNT_ESTIMATE_THRESHOLD:
+            return self.fallback.count(queryset)
+        return estimate
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        unfiltered = is_unfiltered(queryset)
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                if unfiltered:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class "
+                        "WHERE oid = %s::regclass",
+                        [connection.ops.quote_name(table)],
+                    )
+                    row = cursor.fetchone()
+                    # -1 until the table has been vacuumed or analyzed.
+                    return row[0] if row and row[0] >= 0 else None
+                sql, params = queryset.order_by().query.sql_with_params()
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]["Plan"]["Plan Rows"])
+            if connection.vendor == "sqlite" and unfiltered:
+                # Filled in by ANALYZE; the first number is the row count.
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+                counts = [int(row[0].split()[0]) for row in cursor.fetchall()]
+                return max(counts) if counts else None
+        return None
+
+
+class NoCountProvider(CountProvider):
+    """No total; pages only tell whether another page follows."""
+
+    def count(self, queryset):
+        return None
+
+
+COUNT_PROVIDERS = {
+    "exact": ExactCountProvider(),
+    "cached": CachedCountProvider(),
+    "estimated": EstimatedCountProvider(),
+    "none": NoCountProvider(),
+}
+
+
+def get_count_provider(strategy):
+    return COUNT_PROVIDERS.get(strategy) or COUNT_PROVIDERS[COUNT_STRATEGY]
+
+
+class UncountedPage(Page):
+    def has_next(self):
+        return self.has_more
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator that takes its count from a count provider. Without a count,
+    each page fetches one extra row to learn whether another page follows,
+    and ``count`` and ``num_pages`` are None.
+    """
+
+    def __init__(self, object_list, per_page, provider, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.provider = provider
+
+    @cached_property
+    def count(self):
+        return self.provider.count(self.object_list)
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return Paginator.num_pages.func(self)
+
+    def validate_number(self, number):
+        if self.count is not None:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        if self.count is not None:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages["no_results"])
+        page = UncountedPage(rows[: self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
@@ -0,0 +1,114 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import ProtectedError, RestrictedError
+from django.db.models.deletion import Collector
+from django.db.models.signals import post_delete, pre_delete
+
+from common.cache import bump_model_version
+from common.counts import invalidate_total_count
+from common.signals import bump_instance_version, count_instance_deleted
+
+DELETE_CHUNK_SIZE = getattr(settings, "DELETE_CHUNK_SIZE", 1000)
+FAST_DELETE_CHUNK_SIZE = getattr(settings, "FAST_DELETE_CHUNK_SIZE", 50000)
+# Receivers whose work delete_queryset does itself, once per model.
+BULK_HANDLED_RECEIVERS = (bump_instance_version, count_instance_deleted)
+
+
+class BulkCollector(Collector):
+    """
+    Collector that does not count the model-version and row-count receivers
+    as delete signals, so they do not rule out fast deletes.
+    ``delete_queryset`` bumps the versions and resets the counts itself.
+    """
+
+    def _has_signal_listeners(self, model):
+        return any(
+            receiver not in BULK_HANDLED_RECEIVERS
+            for signal in (pre_delete, post_delete)
+            for receivers in signal._live_receivers(model)
+            for receiver in receivers
+        )
+
+
+def can_fast_delete(queryset):
+    """
+    True when deleting from ``queryset`` needs no signals and no cascades,
+    so a plain DELETE statement is enough.
+    """
+    return BulkCollector(using=queryset.db, origin=queryset).can_fast_delete(queryset)
+
+
+def delete_queryset(queryset):
+    """
+    ``queryset.delete()`` through BulkCollector, bumping the version and
+    dropping the cached total of every model it deleted rows from.
+    """
+    collector = BulkCollector(using=queryset.db, origin=queryset)
+    collector.collect(queryset)
+    deleted, per_model = collector.delete()
+    for label in per_model:
+        model = apps.get_model(label)
+        bump_model_version(model, using=queryset.db)
+        invalidate_total_count(model, using=queryset.db)
+    return deleted, per_model
+
+
+def iter_pk_chunks(queryset, chunk_size):
+    last = None
+    queryset = queryset.order_by("pk")
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        pks = list(page.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return
+        last = pks[-1]
+        yield pks
+
+
+def iter_list_chunks(pks, chunk_size):
+    for i in range(0, len(pks), chunk_size):
+        yield pks[i : i + chunk_size]
+
+
+class BulkDeleter:
+    """
+    Deletes rows in primary key chunks, each in its own transaction.
+    Models without delete signals or cascades get large raw DELETE
+    statements; the rest go through Django's collector one chunk at a time.
+    Protected rows are reported per chunk instead of aborting the run.
+    """
+
+    def __init__(self, model, using=None):
+        self.model = model
+        self.manager = model._base_manager.db_manager(using)
+        self.fast = can_fast_delete(self.manager.all())
+        self.chunk_size = FAST_DELETE_CHUNK_SIZE if self.fast else DELETE_CHUNK_SIZE
+
+    def delete_queryset(self, queryset, on_progress=None):
+        return self.delete_chunks(
+            iter_pk_chunks(queryset, self.chunk_size), on_progress
+        )
+
+    def delete_pks(self, pks, on_progress=None):
+        return self.delete_chunks(
+            iter_list_chunks(sorted(pks), self.chunk_size), on_progress
+        )
+
+    def delete_chunks(self, chunks, on_progress=None):
+        result = {"deleted": 0, "protected": []}
+        for pks in chunks:
+            queryset = self.manager.filter(pk__in=pks)
+            try:
+                # Fast-deletable chunks skip the collector and run as a
+                # single DELETE ... WHERE pk IN (...).
+                with transaction.atomic(using=queryset.db):
+                    _, per_model = delete_queryset(queryset)
+                result["deleted"] += per_model.get(self.model._meta.label, 0)
+            except ProtectedError as e:
+                result["protected"].extend(str(obj) for obj in e.protected_objects)
+            except RestrictedError as e:
+                result["protected"].extend(str(obj) for obj in e.restricted_objects)
+            if on_progress:
+                on_progress(len(pks))
+        return result
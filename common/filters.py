@@ -1,6 +1,109 @@
+import datetime
+import re
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
 from django_filters import CharFilter, FilterSet
+from rest_framework import filters
+
+from common.registry import model_registry
+from common.trigram import get_trigram_backend, get_trigram_fields
+
+OPERATOR_MAP = {
+    "is": "exact",
+    "is not": "exact",
+    "contains": "icontains",
+    "doesn't contain": "icontains",
+    "is empty": "isnull",
+    "not empty": "isnull",
+    "starts_with": "istartswith",
+    "ends_with": "iendswith",
+    "<": "lt",
+    "<=": "lte",
+    ">": "gt",
+    ">=": "gte",
+    "between": "range",
+    "not between": "range",
+}
+NEGATE_OPERATORS = {"is not", "doesn't contain", "not empty", "not between"}
+
+INTEGER_RE = re.compile(r"^-?\d+$")
+YEAR_MONTH_RE = re.compile(r"^(\d{4})-(\d{1,2})$")
+TEXT_FIELD_CLASSES = (models.CharField, models.TextField)
+INTEGER_FIELD_CLASSES = (models.AutoField, models.IntegerField)
+
+
+class SearchTerm:
+    """
+    A search value classified once per request: the integer, date range and
+    time it can stand for, and whether it looks like an email address.
+    """
+
+    def __init__(self, value):
+        self.value = value = value.strip()
+        self.email = "@" in value
+        self.integer = int(value) if INTEGER_RE.match(value) else None
+        self.time = self.parse(parse_time, value) if ":" in value else None
+        self.dates = self.parse_date_range(value)
+
+    @staticmethod
+    def parse(parser, value):
+        try:
+            return parser(value)
+        except ValueError:
+            return None
+
+    def parse_date_range(self, value):
+        """Half-open [start, end) date range for a day, month or year."""
+        day = self.parse(parse_date, value)
+        if day:
+            return day, day + datetime.timedelta(days=1)
+        match = YEAR_MONTH_RE.match(value)
+        if match and 1 <= int(match[2]) <= 12:
+            start = datetime.date(int(match[1]), int(match[2]), 1)
+            end = (start + datetime.timedelta(days=31)).replace(day=1)
+            return start, end
+        if len(value) == 4 and self.integer is not None and self.integer > 0:
+            return datetime.date(self.integer, 1, 1), datetime.date(
+                self.integer + 1, 1, 1
+            )
+        return None
+
+
+def get_search_lookup(field, term):
+    """
+    The narrowest lookup that can match ``term`` on ``field``, or None when
+    no value of the field can match it.
+    """
+    name = field.name
+    if isinstance(field, TEXT_FIELD_CLASSES):
+        if term.email and isinstance(field, (models.SlugField, models.URLField)):
+            return None
+        return get_trigram_backend().match(field.model, name, term.value) or Q(
+            **{f"{name}__icontains": term.value}
+        )
+    if isinstance(field, INTEGER_FIELD_CLASSES):
+        return Q(**{name: term.integer}) if term.integer is not None else None
+    if isinstance(field, models.DateTimeField):
+        if term.dates is None:
+            return None
+        start, end = (
+            datetime.datetime.combine(day, datetime.time.min) for day in term.dates
+        )
+        if settings.USE_TZ:
+            start, end = timezone.make_aware(start), timezone.make_aware(end)
+        return Q(**{f"{name}__gte": start, f"{name}__lt": end})
+    if isinstance(field, models.DateField):
+        if term.dates is None:
+            return None
+        return Q(**{f"{name}__gte": term.dates[0], f"{name}__lt": term.dates[1]})
+    if isinstance(field, models.TimeField):
+        return Q(**{name: term.time}) if term.time is not None else None
+    return Q(**{f"{name}__icontains": term.value})
 
 
 class DynamicSearchFilterSet(FilterSet):
@@ -23,28 +126,12 @@ class DynamicSearchFilterSet(FilterSet):
         exclude_fields = getattr(self._meta, "search_exclude_fields", [])
 
         if not self._search_fields:
-            self._search_fields = [
-                field.name
-                for field in model._meta.fields
-                if isinstance(
-                    field,
-                    (
-                        models.CharField,
-                        models.TextField,
-                        models.EmailField,
-                        models.URLField,
-                        models.SlugField,
-                        models.DateField,
-                        models.DateTimeField,
-                        models.TimeField,
-                        models.BigAutoField,
-                    ),
-                )
-            ]
+            self._search_fields = model_registry.get(model).text_search_fields
 
         self._search_fields = [
             field for field in self._search_fields if field not in exclude_fields
         ]
+        self._search_model = model
 
         super().__init__(*args, **kwargs)
 
@@ -52,8 +139,93 @@ class DynamicSearchFilterSet(FilterSet):
         if not value:
             return queryset
 
+        term = SearchTerm(value)
         query = Q()
-        for field in self._search_fields:
-            query |= Q(**{f"{field}__icontains": value})
+        for name in self._search_fields:
+            try:
+                field = self._search_model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Related paths such as "owner__email" keep the plain lookup.
+                query |= Q(**{f"{name}__icontains": value})
+                continue
+            lookup = get_search_lookup(field, term)
+            if lookup is not None:
+                query |= lookup
 
+        if not query:
+            return queryset.none()
         return queryset.filter(query)
+
+
+class SearchFilter(filters.SearchFilter):
+    """
+    DRF's SearchFilter, except that plain icontains lookups on fields with
+    a trigram index are answered from the index instead of a LIKE scan.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+        model = queryset.model
+        if not search_fields or not search_terms or not get_trigram_fields(model):
+            return super().filter_queryset(request, queryset, view)
+
+        backend = get_trigram_backend()
+        base = queryset
+        conditions = Q()
+        for term in search_terms:
+            condition = Q()
+            for search_field in map(str, search_fields):
+                condition |= backend.match(model, search_field, term) or Q(
+                    **{self.construct_search(search_field, queryset): term}
+                )
+            conditions &= condition
+        queryset = queryset.filter(conditions)
+
+        if self.must_call_distinct(queryset, search_fields):
+            queryset = base.filter(Exists(queryset.filter(pk=OuterRef("pk"))))
+        return queryset
+
+
+def build_condition_query(conditions, strict=False):
+    """
+    Translates the condition list sent by the export and mass action
+    endpoints ({field, operator, value, connector}) into a Q object.
+    Malformed conditions are skipped, or raise ValueError when ``strict``.
+    """
+    q_objects = Q()
+    for cond in conditions:
+        if not isinstance(cond, dict):
+            if strict:
+                raise ValueError(f"Invalid condition: {cond!r}.")
+            continue
+        field = cond.get("field")
+        operator = cond.get("operator")
+        value = cond.get("value")
+        connector = str(cond.get("connector", "AND")).upper()
+
+        if not field or not operator:
+            if strict:
+                raise ValueError(f"Condition needs a field and an operator: {cond!r}.")
+            continue
+
+        lookup = OPERATOR_MAP.get(operator)
+        if not lookup:
+            if strict:
+                raise ValueError(f"Unknown operator '{operator}'.")
+            continue
+        if strict and connector not in ("AND", "OR"):
+            raise ValueError(f"Unknown connector '{connector}'.")
+
+        if operator in {"is empty", "not empty"}:
+            q = Q(**{f"{field}__{lookup}": operator == "is empty"})
+        elif operator in {"between", "not between"}:
+            q = Q(**{f"{field}__{lookup}": value})
+        else:
+            q = Q(**{f"{field}__{lookup}": value})
+
+        if operator in NEGATE_OPERATORS:
+            q = ~q
+
+        q_objects = q_objects & q if connector == "AND" else q_objects | q
+    return q_objects
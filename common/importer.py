@@ -0,0 +1,630 @@
+import math
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from common.cache import bump_model_version
+from common.counts import invalidate_total_count
+from common.signals import rows_changed
+
+IMPORT_CHUNK_SIZE = getattr(settings, "IMPORT_CHUNK_SIZE", 5000)
+IMPORT_BATCH_SIZE = getattr(settings, "IMPORT_BATCH_SIZE", 1000)
+IMPORT_MAX_SHARDS = getattr(settings, "IMPORT_MAX_SHARDS", 8)
+# Natural keys of related rows remembered per foreign key across chunks.
+IMPORT_RELATED_CACHE_SIZE = getattr(settings, "IMPORT_RELATED_CACHE_SIZE", 10000)
+RESULT_COLUMNS = ["row", "status", "message"]
+TRUE_STRINGS = ["true", "t", "yes", "y", "1", "on"]
+FALSE_STRINGS = ["false", "f", "no", "n", "0", "off"]
+INTEGER_TYPES = {
+    "AutoField",
+    "BigAutoField",
+    "SmallAutoField",
+    "IntegerField",
+    "BigIntegerField",
+    "SmallIntegerField",
+    "PositiveIntegerField",
+    "PositiveBigIntegerField",
+    "PositiveSmallIntegerField",
+}
+OFFSET_PATTERN = r"(?:Z|[+-]\d{2}:?\d{2})$"
+
+
+def count_rows(path):
+    """Cheap row estimate for progress reporting: data lines minus the header."""
+    lines = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+    return max(lines - 1, 0)
+
+
+def read_chunks(path, chunk_size=IMPORT_CHUNK_SIZE):
+    reader = pd.read_csv(path, dtype=str, chunksize=chunk_size)
+    for df in reader:
+        df = df.dropna(how="all").replace(r"^\s*$", None, regex=True).dropna(how="all")
+        if len(df):
+            yield df
+
+
+def get_shard_ranges(total_rows, shards, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Splits a file of about ``total_rows`` rows into ``shards`` contiguous,
+    half-open ranges of chunk indexes, at least one chunk each. The last
+    range is open-ended since the row count is an estimate.
+    """
+    chunks = max(1, math.ceil(total_rows / chunk_size))
+    shards = max(1, min(int(shards or 1), IMPORT_MAX_SHARDS, chunks))
+    bounds = [shard * chunks // shards for shard in range(shards)]
+    return [(lower, upper) for lower, upper in zip(bounds, [*bounds[1:], None])]
+
+
+def split_mapping(model, name):
+    """
+    The field a mapping targets and, for ``<foreign key>__<field>``
+    mappings, the field of the related model its values are looked up by.
+    """
+    field_name, _, lookup = name.partition("__")
+    field = model._meta.get_field(field_name)
+    if not lookup:
+        return field, None
+    if not (field.many_to_one or field.one_to_one) or not field.concrete:
+        raise FieldDoesNotExist(f"{name} is not a foreign key lookup.")
+    lookup_field = field.related_model._meta.get_field(lookup)
+    if not lookup_field.concrete or lookup_field.is_relation:
+        raise FieldDoesNotExist(f"{name} is not a foreign key lookup.")
+    return field, lookup_field
+
+
+def to_cell(value):
+    """A default value as the CSV reader would have produced it."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    return value
+
+
+def to_objects(values, index):
+    """Object Series over ``index`` with None for missing values."""
+    values = values.astype(object).reindex(index)
+    return values.where(values.notna(), None)
+
+
+def coerce_integer(field, text, connection):
+    number = pd.to_numeric(text, errors="coerce")
+    invalid = number.isna() | (number % 1 != 0)
+    try:
+        lower, upper = connection.ops.integer_field_range(field.get_internal_type())
+    except KeyError:
+        lower = upper = None
+    if lower is not None:
+        invalid |= number < lower
+    if upper is not None:
+        invalid |= number > upper
+    return number[~invalid].astype("int64"), invalid
+
+
+def coerce_float(field, text, connection):
+    number = pd.to_numeric(text, errors="coerce")
+    invalid = number.isna() | np.isinf(number)
+    return number[~invalid], invalid
+
+
+def coerce_decimal(field, text, connection):
+    parts = text.str.extract(r"^[+-]?(\d*)(?:\.(\d*))?$")
+    digits = parts[0].fillna("").str.len() + parts[1].fillna("").str.len()
+    invalid = parts[0].isna() | (digits == 0)
+    # Extra decimal places are rounded on save; extra integer digits fail.
+    whole = parts[0].fillna("").str.lstrip("0").str.len()
+    invalid |= whole > field.max_digits - field.decimal_places
+    return text[~invalid].map(Decimal), invalid
+
+
+def coerce_boolean(field, text, connection):
+    lower = text.str.lower()
+    true = lower.isin(TRUE_STRINGS)
+    invalid = ~(true | lower.isin(FALSE_STRINGS))
+    return true[~invalid], invalid
+
+
+def coerce_date(field, text, connection):
+    parsed = pd.to_datetime(text, errors="coerce", format="ISO8601")
+    invalid = parsed.isna()
+    return parsed[~invalid].dt.date, invalid
+
+
+def coerce_datetime(field, text, connection):
+    # Values without an offset are in the current time zone, as in forms.
+    aware = text.str.contains(OFFSET_PATTERN, regex=True)
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns, UTC]")
+    if aware.any():
+        parsed[aware] = pd.to_datetime(
+            text[aware], errors="coerce", format="ISO8601", utc=True
+        )
+    if (~aware).any():
+        naive = pd.to_datetime(text[~aware], errors="coerce", format="ISO8601")
+        parsed[~aware] = naive.dt.tz_localize(
+            timezone.get_current_timezone(), ambiguous="NaT", nonexistent="NaT"
+        ).dt.tz_convert("UTC")
+    invalid = parsed.isna()
+    parsed = parsed[~invalid]
+    if not settings.USE_TZ:
+        parsed = parsed.dt.tz_convert(timezone.get_current_timezone()).dt.tz_localize(
+            None
+        )
+    return parsed.map(pd.Timestamp.to_pydatetime), invalid
+
+
+def coerce_time(field, text, connection):
+    parsed = pd.to_datetime("2000-01-01T" + text, errors="coerce", format="ISO8601")
+    invalid = parsed.isna()
+    return parsed[~invalid].dt.time, invalid
+
+
+def coerce_uuid(field, text, connection):
+    digits = text.str.lower().str.replace(r"[{}-]", "", regex=True)
+    invalid = ~digits.str.fullmatch(r"[0-9a-f]{32}")
+    return digits[~invalid].map(uuid.UUID), invalid
+
+
+COERCERS = {
+    "DecimalField": coerce_decimal,
+    "FloatField": coerce_float,
+    "BooleanField": coerce_boolean,
+    "DateField": coerce_date,
+    "DateTimeField": coerce_datetime,
+    "TimeField": coerce_time,
+    "UUIDField": coerce_uuid,
+    **dict.fromkeys(INTEGER_TYPES, coerce_integer),
+}
+
+
+class RelatedResolver:
+    """
+    Resolves natural keys (values of ``lookup`` on the related model) to
+    the values a foreign key stores. Keys of a chunk that are not in the
+    bounded LRU are fetched with one ``__in`` query; with ``create``,
+    keys that match no row are created in bulk first. Keys that match
+    several rows stay unresolved.
+    """
+
+    def __init__(
+        self, field, lookup, create=False, cache_size=IMPORT_RELATED_CACHE_SIZE
+    ):
+        self.model = field.related_model
+        self.target = field.target_field
+        self.lookup = lookup
+        self.create = create
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.db = router.db_for_write(self.model)
+
+    def resolve(self, keys):
+        """Maps a Series of keys to foreign key values, None when unresolved."""
+        resolved = {}
+        missing = []
+        for key in keys.unique():
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                resolved[key] = self.cache[key]
+            else:
+                missing.append(key)
+        if missing:
+            found = self.fetch(missing)
+            if self.create:
+                new = [key for key in missing if key not in found]
+                if new:
+                    self.create_missing(new)
+                    found.update(self.fetch(new))
+            for key, value in found.items():
+                if value is not None:
+                    resolved[key] = self.remember(key, value)
+        return pd.Series(
+            [resolved.get(key) for key in keys], index=keys.index, dtype=object
+        )
+
+    def fetch(self, keys):
+        """``{key: value}`` for the keys with rows; None when ambiguous."""
+        found = {}
+        for queryset in self.filter_keys(keys):
+            rows = queryset.values_list(self.lookup.attname, self.target.attname)
+            for key, value in rows:
+                found[key] = None if key in found else value
+        return found
+
+    def filter_keys(self, keys):
+        """Querysets for the rows matching ``keys``, batched for the backend."""
+        connection = connections[self.db]
+        size = connection.ops.bulk_batch_size([self.lookup], keys) or len(keys)
+        for i in range(0, len(keys), size):
+            yield self.model._base_manager.using(self.db).filter(
+                **{f"{self.lookup.name}__in": keys[i : i + size]}
+            )
+
+    def create_missing(self, keys):
+        objs = [self.model(**{self.lookup.attname: key}) for key in keys]
+        try:
+            with transaction.atomic(using=self.db):
+                if self.model._meta.parents:
+                    for obj in objs:
+                        obj.save(force_insert=True, using=self.db)
+                else:
+                    self.model._base_manager.using(self.db).bulk_create(
+                        objs, batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True
+                    )
+        except Exception:
+            # The rows that needed them are reported as invalid.
+            return
+        # Bulk inserts send no post_save.
+        bump_model_version(self.model, using=self.db)
+        invalidate_total_count(self.model, using=self.db)
+        # ignore_conflicts leaves the primary keys unset.
+        pks = []
+        for queryset in self.filter_keys(keys):
+            pks.extend(queryset.values_list("pk", flat=True))
+        rows_changed.send(sender=self.model, pks=pks)
+
+    def remember(self, key, value):
+        self.cache[key] = value
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return value
+
+
+class ChunkValidator:
+    """
+    Vectorised validation stage for an import chunk. Fills blanks from
+    ``default_values``, coerces every mapped column to its field's type
+    (numbers, decimals, booleans, dates, times, UUIDs, choices, max_length,
+    and foreign keys by their target field) and flags invalid cells with
+    boolean masks, one column at a time rather than one row at a time.
+
+    Mappings named ``<foreign key>__<field>`` are resolved to the related
+    row through a RelatedResolver; ``create_related`` lists the foreign
+    keys whose missing related rows are created.
+    """
+
+    def __init__(
+        self,
+        model,
+        mappings,
+        required_fields,
+        default_values=None,
+        create_related=(),
+    ):
+        self.model = model
+        self.mappings = mappings
+        self.required_fields = [model._meta.get_field(name) for name in required_fields]
+        self.default_values = {
+            name: to_cell(value)
+            for name, value in (default_values or {}).items()
+            if value not in (None, "")
+        }
+        self.fields = []
+        self.resolvers = {}
+        for name in dict.fromkeys([*mappings, *self.default_values]):
+            field, lookup = split_mapping(model, name)
+            self.fields.append((name, field))
+            if lookup is not None:
+                self.resolvers[name] = RelatedResolver(
+                    field, lookup, create=field.name in create_related
+                )
+        self.connection = connections[router.db_for_write(model)]
+
+    def get_column(self, df, name):
+        column = self.mappings.get(name)
+        if column in df.columns:
+            raw = df[column].astype(object)
+        else:
+            raw = pd.Series(None, index=df.index, dtype=object)
+        raw = raw.where(raw.notna(), None)
+        if name in self.default_values:
+            default = self.default_values[name]
+            raw = raw.where(
+                raw.notna(), pd.Series([default] * len(raw), index=raw.index)
+            )
+        return raw
+
+    def coerce(self, field, raw):
+        target = field.target_field if field.many_to_one or field.one_to_one else field
+        if target.get_internal_type() == "JSONField":
+            return raw, pd.Series(False, index=raw.index)
+        text = raw[raw.notna()].astype(str)
+        invalid = pd.Series(False, index=text.index)
+        coercer = COERCERS.get(target.get_internal_type())
+
+        if field.choices:
+            text = text.str.strip()
+            invalid |= ~text.isin([str(key) for key, _ in field.flatchoices])
+        if coercer is not None:
+            values, bad = coercer(target, text.str.strip(), self.connection)
+            invalid |= bad
+        else:
+            values = text
+            if getattr(target, "max_length", None):
+                invalid |= text.str.len() > target.max_length
+        invalid = invalid.reindex(raw.index, fill_value=False)
+        values = to_objects(values, raw.index)
+        return values.mask(invalid, None), invalid
+
+    def resolve(self, name, field, raw):
+        resolver = self.resolvers[name]
+        keys, invalid = self.coerce(resolver.lookup, raw)
+        keys = keys[keys.notna()]
+        values = resolver.resolve(keys)
+        invalid |= values.isna().reindex(raw.index, fill_value=False)
+        values = to_objects(values, raw.index)
+        return values.mask(invalid, None), invalid
+
+    def validate(self, df, check_required=True):
+        """
+        Returns the coerced values (columns named by attname, None for
+        blank or invalid cells) and the error message of every row, None
+        for clean rows.
+        """
+        columns, invalid, missing = {}, {}, {}
+        for name, field in self.fields:
+            raw = self.get_column(df, name)
+            if name in self.resolvers:
+                columns[field.attname], invalid[name] = self.resolve(name, field, raw)
+            else:
+                columns[field.attname], invalid[name] = self.coerce(field, raw)
+            if field in self.required_fields:
+                missing[field.name] = raw.isna()
+        if check_required:
+            for field in self.required_fields:
+                missing.setdefault(field.name, pd.Series(True, index=df.index))
+        else:
+            missing = {}
+
+        missing = self.describe("Missing required fields", missing, df.index)
+        invalid = self.describe("Invalid values for", invalid, df.index)
+        errors = missing.where(invalid.isna(), missing + "; " + invalid)
+        errors = errors.where(missing.notna(), invalid)
+        return pd.DataFrame(columns, index=df.index), errors.astype(object).where(
+            errors.notna(), None
+        )
+
+    def describe(self, label, masks, index):
+        """``label: name, name`` for the rows where any mask is set, else NaN."""
+        names = pd.Series("", index=index)
+        for name, mask in masks.items():
+            names = names.mask(mask, names + ", " + name)
+        return (label + ": " + names.str[2:]).where(names != "")
+
+
+class BulkImporter:
+    """
+    Turns DataFrame chunks into model instances and writes them with
+    ``bulk_create``/``bulk_update``, one transaction per batch. A failing
+    batch is bisected until the offending rows are isolated, so only those
+    rows are reported as errors.
+
+    Upserts match rows on ``key_field`` (the primary key or another unique
+    field), fetch the existing objects once per chunk with ``in_bulk`` and
+    only write the columns that actually changed. Blank cells leave the
+    existing value alone unless ``default_values`` fills them; auto_now
+    fields are stamped on every changed row.
+    """
+
+    def __init__(
+        self,
+        model,
+        mappings,
+        required_fields,
+        key_field=None,
+        batch_size=IMPORT_BATCH_SIZE,
+        default_values=None,
+        create_related=(),
+    ):
+        self.model = model
+        self.mappings = mappings
+        self.required_fields = required_fields
+        self.batch_size = batch_size
+        self.validator = ChunkValidator(
+            model, mappings, required_fields, default_values, create_related
+        )
+        self.keeps_pk = model._meta.pk.name in mappings
+        # Multi-table inheritance is not supported by bulk_create.
+        self.bulk = not model._meta.parents
+        self.key_field = model._meta.get_field(key_field or model._meta.pk.name)
+        self.update_fields = [
+            field
+            for field in dict.fromkeys(
+                split_mapping(model, name)[0]
+                for name in [*mappings, *self.validator.default_values]
+            )
+            if field != self.key_field
+        ]
+        self.auto_now_fields = [
+            field
+            for field in model._meta.concrete_fields
+            if getattr(field, "auto_now", False) and field not in self.update_fields
+        ]
+
+    def validate(self, df, start, check_required=True):
+        """
+        Runs the validation stage over a chunk. Returns the error results
+        and ``(row number, values)`` for every clean row, with blank values
+        left out so model defaults apply.
+        """
+        values, errors = self.validator.validate(df, check_required)
+        rows = np.arange(start, start + len(df))
+        failed = errors.notna().to_numpy()
+        results = [
+            {"row": idx, "status": "error", "message": message}
+            for idx, message in zip(rows[failed].tolist(), errors[failed])
+        ]
+        clean = [
+            (idx, {name: value for name, value in record.items() if value is not None})
+            for idx, record in zip(
+                rows[~failed].tolist(), values[~failed].to_dict(orient="records")
+            )
+        ]
+        return clean, results
+
+    def build_instances(self, df, start):
+        clean, results = self.validate(df, start)
+        pending = []
+        for idx, values in clean:
+            try:
+                pending.append((idx, self.model(**values)))
+            except Exception as e:
+                results.append({"row": idx, "status": "error", "message": str(e)})
+        return pending, results
+
+    def import_chunk(self, df, start):
+        pending, results = self.build_instances(df, start)
+        for i in range(0, len(pending), self.batch_size):
+            results.extend(self.insert(pending[i : i + self.batch_size]))
+        results.sort(key=lambda result: result["row"])
+        return results
+
+    def upsert_chunk(self, df, start, create_missing=False):
+        keyed = {}
+        key_name = self.key_field.name
+        clean, results = self.validate(df, start, check_required=False)
+        for idx, values in clean:
+            try:
+                key = self.key_field.to_python(values.get(self.key_field.attname))
+                if key is None:
+                    raise ValueError(f"Missing required fields: {key_name}")
+            except Exception as e:
+                results.append({"row": idx, "status": "error", "message": str(e)})
+                continue
+            if key in keyed:
+                results.append(
+                    {
+                        "row": keyed[key][0],
+                        "status": "error",
+                        "message": f"Duplicate {key_name} {key}; superseded by row {idx}",
+                    }
+                )
+            keyed[key] = (idx, values)
+
+        existing = self.model.objects.in_bulk(list(keyed), field_name=key_name)
+        updates, creates = [], []
+        for key, (idx, values) in keyed.items():
+            obj = existing.get(key)
+            if obj is None and not create_missing:
+                results.append(
+                    {
+                        "row": idx,
+                        "status": "error",
+                        "message": f"No {self.model.__name__} with {key_name} {key}",
+                    }
+                )
+                continue
+            try:
+                if obj is None:
+                    missing = [
+                        field
+                        for field in self.required_fields
+                        if values.get(self.model._meta.get_field(field).attname) is None
+                    ]
+                    if missing:
+                        raise ValueError(
+                            f"Missing required fields: {', '.join(missing)}"
+                        )
+                    creates.append((idx, self.model(**values)))
+                else:
+                    updates.append((idx, obj, self.apply_changes(obj, values)))
+            except Exception as e:
+                results.append({"row": idx, "status": "error", "message": str(e)})
+
+        for i in range(0, len(updates), self.batch_size):
+            results.extend(
+                self.write(updates[i : i + self.batch_size], self.update_rows)
+            )
+        for i in range(0, len(creates), self.batch_size):
+            results.extend(
+                self.write(creates[i : i + self.batch_size], self.upsert_rows)
+            )
+        results.sort(key=lambda result: result["row"])
+        return results
+
+    def apply_changes(self, obj, values):
+        changed = []
+        for field in self.update_fields:
+            # Blank cells are left out of ``values``.
+            if field.attname not in values:
+                continue
+            value = field.to_python(values[field.attname])
+            if getattr(obj, field.attname) != value:
+                setattr(obj, field.attname, value)
+                changed.append(field.name)
+        return tuple(changed)
+
+    def insert(self, rows):
+        return self.write(rows, self.create_rows)
+
+    def write(self, rows, operation):
+        try:
+            with transaction.atomic():
+                operation(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                return [{"row": rows[0][0], "status": "error", "message": str(e)}]
+            middle = len(rows) // 2
+            return self.write(rows[:middle], operation) + self.write(
+                rows[middle:], operation
+            )
+        return [
+            {"row": row[0], "status": "success", "message": row[1].pk} for row in rows
+        ]
+
+    def create_rows(self, rows, **options):
+        try:
+            if self.bulk:
+                self.model.objects.bulk_create([obj for _, obj in rows], **options)
+            else:
+                for _, obj in rows:
+                    obj.save(force_insert=True)
+        except Exception:
+            self.reset(rows)
+            raise
+        # Bulk writes send no post_save; these only run if the batch commits.
+        bump_model_version(self.model)
+        invalidate_total_count(self.model)
+
+    def upsert_rows(self, rows):
+        # update_conflicts covers rows inserted by someone else since in_bulk.
+        if not self.bulk or not self.update_fields:
+            return self.create_rows(rows)
+        self.create_rows(
+            rows,
+            update_conflicts=True,
+            unique_fields=[self.key_field.name],
+            update_fields=[
+                field.name for field in [*self.update_fields, *self.auto_now_fields]
+            ],
+        )
+
+    def update_rows(self, rows):
+        groups = {}
+        now = timezone.now()
+        for _, obj, changed in rows:
+            if changed:
+                for field in self.auto_now_fields:
+                    setattr(obj, field.attname, now)
+                groups.setdefault(changed, []).append(obj)
+        auto_now = tuple(field.name for field in self.auto_now_fields)
+        for fields, objs in groups.items():
+            self.model.objects.bulk_update(objs, fields + auto_now)
+        if groups:
+            bump_model_version(self.model)
+
+    def reset(self, rows):
+        # Primary keys assigned before the rollback are no longer valid.
+        for _, obj in rows:
+            if not self.keeps_pk:
+                obj.pk = None
+            obj._state.adding = True
+            obj._state.db = None
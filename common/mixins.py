@@ -1,60 +1,65 @@
+import base64
+import copy
 import json
 
 from celery.result import AsyncResult
 from django.apps import apps
 from django.conf import settings
-from django.db import models
-from django.db.models import ProtectedError, Q
-from django.db.models.fields import NOT_PROVIDED
-from django.urls import reverse
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.core.paginator import InvalidPage
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.http import StreamingHttpResponse
+from django.urls import NoReverseMatch, get_resolver, get_script_prefix, reverse
+from django.utils import timezone
 from rest_framework import serializers, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from api.celery import app
-from common.tasks import start_import
-from core.models import Import
-
-OPERATOR_MAP = {
-    "is": "exact",
-    "is not": "exact",
-    "contains": "icontains",
-    "doesn't contain": "icontains",
-    "is empty": "isnull",
-    "not empty": "isnull",
-    "starts_with": "istartswith",
-    "ends_with": "iendswith",
-    "<": "lt",
-    "<=": "lte",
-    ">": "gt",
-    ">=": "gte",
-    "between": "range",
-    "not between": "range",
-}
-NEGATE_OPERATORS = {"is not", "doesn't contain", "not empty", "not between"}
+from common.cache import bump_model_version
+from common.counts import (
+    COUNT_PROVIDERS,
+    COUNT_STRATEGY,
+    CountedPaginator,
+    get_count_provider,
+)
+from common.deletion import DELETE_CHUNK_SIZE, BulkDeleter, delete_queryset
+from common.exporter import (
+    STREAM_FORMATS,
+    astream_rows,
+    get_export_columns,
+    get_export_queryset,
+    stream_rows,
+)
+from common.filters import build_condition_query
+from common.importer import split_mapping
+from common.progress import get_task_snapshot
+from common.registry import model_registry
+from common.renderers import is_asgi_request
+from common.signals import rows_changed
+from common.tasks import dispatch_export, dispatch_import, start_delete
+from core.models import Export, Import
+
+URL_PK_PLACEHOLDER = "__pk__"
+MASS_ACTION_CHUNK_SIZE = getattr(settings, "MASS_ACTION_CHUNK_SIZE", 1000)
+MASS_DELETE_SYNC_LIMIT = getattr(settings, "MASS_DELETE_SYNC_LIMIT", DELETE_CHUNK_SIZE)
 
 
 class MetadataMixin:
+    count_strategy = COUNT_STRATEGY
+
     def to_representation(self, instance):
         model = self.Meta.model
         data = super().to_representation(instance)
 
-        field_metadata = []
-        for field in self.Meta.model._meta.get_fields():
-            if isinstance(field, (models.ManyToOneRel, models.ManyToManyRel)):
-                continue
-
-            field_info = {
-                "name": field.name,
-                "null": getattr(field, "null", None),
-                "primary_key": getattr(field, "primary_key", False),
-            }
-            field_metadata.append(field_info)
-
         metadata = {
-            "total_records": self.Meta.model.objects.count(),
-            "fields": field_metadata,
+            "total_records": self.get_total_records(),
+            "fields": model_registry.get(model).field_summary,
             "author": "Eco Home Group Team",
             "app_label": model._meta.app_label,
             "model": model.__name__,
@@ -65,15 +70,255 @@ class MetadataMixin:
             "data": data,
         }
 
+    def get_total_records(self):
+        # A list serializer renders every row through the same child, so
+        # the total is looked up once per page.
+        if not hasattr(self, "_total_records"):
+            self._total_records = get_count_provider(self.count_strategy).count(
+                self.Meta.model.objects.all()
+            )
+        return self._total_records
+
 
 class PaginationMixin(PageNumberPagination):
     page_size = 100
     page_size_query_param = "page_size"
     max_page_size = 200
+    pagination_mode = "page"
+    pagination_mode_query_param = "pagination"
+    pagination_modes = ("page", "cursor")
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    count_strategy = COUNT_STRATEGY
+    count_query_param = "count"
+    count_strategies = tuple(COUNT_PROVIDERS)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.model = queryset.model
+        self.mode = self.get_pagination_mode(request, view)
+        if self.mode == "cursor":
+            return self.paginate_queryset_by_cursor(queryset, request, view)
+        return self.paginate_queryset_by_page(queryset, request, view)
+
+    def get_count_strategy(self, request, view=None):
+        strategy = request.query_params.get(self.count_query_param)
+        if strategy not in self.count_strategies:
+            strategy = getattr(view, "count_strategy", self.count_strategy)
+        return strategy
+
+    def paginate_queryset_by_page(self, queryset, request, view=None):
+        """
+        PageNumberPagination.paginate_queryset with the total taken from
+        the view's count strategy instead of a COUNT for every page.
+        """
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        provider = get_count_provider(self.get_count_strategy(request, view))
+        paginator = CountedPaginator(queryset, page_size, provider)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+
+        if self.template is not None and (
+            paginator.num_pages is None or paginator.num_pages > 1
+        ):
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+    def get_pagination_mode(self, request, view=None):
+        mode = request.query_params.get(self.pagination_mode_query_param)
+        if mode not in self.pagination_modes:
+            mode = getattr(view, "pagination_mode", self.pagination_mode)
+        return mode
+
+    def paginate_queryset_by_cursor(self, queryset, request, view=None):
+        """
+        Keyset pagination over the queryset ordering plus the primary key.
+        Each page is a single indexed range scan, without COUNT or OFFSET.
+        """
+        self.request = request
+        self.page = None
+        self.cursor_page_size = self.get_page_size(request)
+        if not self.cursor_page_size:
+            return None
+
+        self.ordering = self.get_cursor_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor["r"])
+
+        queryset = queryset.order_by(
+            *[
+                self.get_order_expression(name, descending, reverse)
+                for name, descending in self.ordering
+            ]
+        )
+        if cursor:
+            queryset = queryset.filter(self.get_keyset_filter(cursor["v"], reverse))
+
+        results = list(queryset[: self.cursor_page_size + 1])
+        has_more = len(results) > self.cursor_page_size
+        results = results[: self.cursor_page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else cursor is not None
+        self.cursor_results = results
+        return results
+
+    def get_cursor_ordering(self, queryset):
+        model = queryset.model
+        pk_name = model._meta.pk.name
+        ordering = []
+        for item in queryset.query.order_by or model._meta.ordering:
+            if not isinstance(item, str) or item == "?":
+                continue
+            descending = item.startswith("-")
+            name = item.lstrip("-")
+            if name == "pk":
+                name = pk_name
+            if "__" not in name:
+                try:
+                    field = model._meta.get_field(name)
+                except Exception:
+                    continue
+                if field.is_relation and not field.concrete:
+                    continue
+                name = field.attname
+            ordering.append((name, descending))
+
+        if pk_name not in [name for name, _ in ordering]:
+            ordering.append((pk_name, ordering[0][1] if ordering else False))
+        return ordering
+
+    def get_order_expression(self, name, descending, reverse=False):
+        # NULLs always sort last going forward, so walking backwards puts them first.
+        if reverse:
+            return (
+                F(name).asc(nulls_first=True)
+                if descending
+                else F(name).desc(nulls_first=True)
+            )
+        return (
+            F(name).desc(nulls_last=True)
+            if descending
+            else F(name).asc(nulls_last=True)
+        )
+
+    def get_keyset_filter(self, values, reverse=False):
+        condition = None
+        prefix = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            if not reverse:
+                lookup = "lt" if descending else "gt"
+                beyond = (
+                    None
+                    if value is None
+                    else Q(**{f"{name}__{lookup}": value})
+                    | Q(**{f"{name}__isnull": True})
+                )
+            else:
+                lookup = "gt" if descending else "lt"
+                beyond = (
+                    Q(**{f"{name}__isnull": False})
+                    if value is None
+                    else Q(**{f"{name}__{lookup}": value})
+                )
+
+            if beyond is not None:
+                clause = prefix & beyond
+                condition = clause if condition is None else condition | clause
+
+            prefix &= (
+                Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+            )
+        return condition
+
+    def get_cursor_values(self, instance):
+        if isinstance(instance, dict):
+            # A values() row, as served by BaseModelViewSet.list_values.
+            return [instance[name] for name, _ in self.ordering]
+        values = []
+        for name, _ in self.ordering:
+            value = instance
+            for part in name.split("__"):
+                value = getattr(value, part, None) if value is not None else None
+            values.append(value)
+        return values
+
+    def encode_cursor(self, values, reverse=False):
+        payload = json.dumps(
+            {"v": values, "r": int(reverse)},
+            default=lambda v: v.isoformat() if hasattr(v, "isoformat") else str(v),
+            separators=(",", ":"),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            cursor = json.loads(payload)
+            if len(cursor["v"]) != len(self.ordering) or cursor["r"] not in (0, 1):
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def get_cursor_link(self, instance, reverse):
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        token = self.encode_cursor(self.get_cursor_values(instance), reverse)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if self.mode != "cursor":
+            return super().get_next_link()
+        if not self.has_next or not self.cursor_results:
+            return None
+        return self.get_cursor_link(self.cursor_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if self.mode != "cursor":
+            return super().get_previous_link()
+        if not self.has_previous or not self.cursor_results:
+            return None
+        return self.get_cursor_link(self.cursor_results[0], reverse=True)
 
     def get_paginated_response(self, data):
-        model = self.page.paginator.object_list.model
+        model = self.model
         model_schema = self.get_model_schema()
+        if self.mode == "cursor":
+            return Response(
+                {
+                    "count": None,
+                    "next": self.get_next_link(),
+                    "previous": self.get_previous_link(),
+                    "results": data,
+                    "metadata": {
+                        "total_records": None,
+                        "page_size": self.cursor_page_size,
+                        "current_page": None,
+                        "total_pages": None,
+                        "model": model.__name__,
+                        "app_label": model._meta.app_label,
+                        "schema": model_schema,
+                        "pagination": self.mode,
+                    },
+                }
+            )
         return Response(
             {
                 "count": self.page.paginator.count,
@@ -88,56 +333,93 @@ class PaginationMixin(PageNumberPagination):
                     "model": model.__name__,
                     "app_label": model._meta.app_label,
                     "schema": model_schema,
+                    "pagination": self.mode,
                 },
             }
         )
 
     def get_model_schema(self):
-        model = self.page.paginator.object_list.model
-        field_metadata = []
-        for field in model._meta.get_fields():
-            if not field.is_relation or (field.is_relation and not field.auto_created):
-                related_model = (
-                    getattr(field.related_model, "__name__", None)
-                    if hasattr(field, "related_model")
-                    else None
-                )
-                field_info = {
-                    "name": field.name,
-                    "type": type(field).__name__,
-                    "null": getattr(field, "null", None),
-                    "primary_key": getattr(field, "primary_key", False),
-                    "related_model": related_model,
-                }
-                field_metadata.append(field_info)
-        return field_metadata
+        return model_registry.get(self.model).field_metadata
 
 
 class MassActionMixin:
     @action(detail=False, methods=["put"], url_path="mass-update")
     def mass_update(self, request):
         ids = request.data.get("ids", [])
+        conditions = request.data.get("conditions", [])
         update_data = request.data.get("data", {})
 
-        if not ids or not update_data:
+        if not (ids or conditions) or not update_data:
             return Response(
-                {"error": "Please provide 'ids' and 'data' for the update."},
+                {
+                    "error": "Please provide 'ids' or 'conditions' and 'data' for the update."
+                },
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        instances = self.queryset.filter(id__in=ids)
-        if not instances.exists():
-            return Response(
-                {"error": "No records found for the provided ids."},
-                status=status.HTTP_404_NOT_FOUND,
-            )
+        if ids:
+            instances = self.queryset.filter(id__in=ids)
+        else:
+            # A condition that selects nothing must not widen to every row.
+            try:
+                if not isinstance(conditions, list):
+                    raise ValueError("'conditions' must be a list.")
+                q_objects = build_condition_query(conditions, strict=True)
+                if not q_objects:
+                    raise ValueError("'conditions' must select some rows.")
+                instances = self.queryset.filter(q_objects)
+            except (ValueError, FieldError) as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=update_data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        values = dict(serializer.validated_data)
+        m2m_values = getattr(serializer, "_validated_m2m_data", {})
+        for field in model_registry.get(self.queryset.model).concrete_fields:
+            if getattr(field, "auto_now", False):
+                values[field.name] = timezone.now()
+
+        notify = rows_changed.has_listeners(self.queryset.model)
+        with transaction.atomic():
+            if m2m_values or notify:
+                pks = list(instances.values_list("pk", flat=True))
+                instances = self.queryset.filter(pk__in=pks)
+            updated = instances.update(**values) if values else instances.count()
+            if not updated:
+                return Response(
+                    {"error": "No records found for the provided ids."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            for name, related_ids in m2m_values.items():
+                self.set_many_to_many(name, pks, related_ids)
+            bump_model_version(self.queryset.model)
+            if notify:
+                rows_changed.send(sender=self.queryset.model, pks=pks)
 
-        for instance in instances:
-            for attr, value in update_data.items():
-                setattr(instance, attr, value)
-            instance.save()
+        return Response(
+            {"message": "Updated successfully", "updated": updated},
+            status=status.HTTP_200_OK,
+        )
 
-        return Response({"message": "Updated successfully"}, status=status.HTTP_200_OK)
+    def set_many_to_many(self, name, pks, related_ids):
+        """Replaces ``name`` on every row in ``pks`` through the M2M table."""
+        field = self.queryset.model._meta.get_field(name)
+        through = field.remote_field.through
+        source = f"{field.m2m_field_name()}_id"
+        target = f"{field.m2m_reverse_field_name()}_id"
+        for i in range(0, len(pks), MASS_ACTION_CHUNK_SIZE):
+            chunk = pks[i : i + MASS_ACTION_CHUNK_SIZE]
+            delete_queryset(through.objects.filter(**{f"{source}__in": chunk}))
+            through.objects.bulk_create(
+                [
+                    through(**{source: pk, target: related_id})
+                    for pk in chunk
+                    for related_id in related_ids
+                ],
+                batch_size=MASS_ACTION_CHUNK_SIZE,
+            )
+        bump_model_version(through)
+        bump_model_version(field.related_model)
 
     @action(detail=False, methods=["delete"], url_path="mass-delete")
     def mass_delete(self, request):
@@ -149,6 +431,30 @@ class MassActionMixin:
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        if len(ids) > MASS_DELETE_SYNC_LIMIT:
+            pks = []
+            for i in range(0, len(ids), MASS_ACTION_CHUNK_SIZE):
+                pks.extend(
+                    self.queryset.filter(
+                        id__in=ids[i : i + MASS_ACTION_CHUNK_SIZE]
+                    ).values_list("pk", flat=True)
+                )
+            if not pks:
+                return Response(
+                    {"error": "No records found for the provided ids."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            Model = self.queryset.model
+            task = start_delete.delay(Model._meta.app_label, Model.__name__, pks)
+            return Response(
+                {
+                    "status": "started",
+                    "task_id": task.id,
+                    "name": f"Deleting {Model.__name__}",
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
+
         instances = self.queryset.filter(id__in=ids)
         if not instances.exists():
             return Response(
@@ -157,21 +463,21 @@ class MassActionMixin:
             )
 
         try:
-            instances.delete()
-        except ProtectedError as e:
-            protected_ids = [str(obj) for obj in e.protected_objects]
+            # A single chunk, so the delete stays all-or-nothing.
+            result = BulkDeleter(self.queryset.model).delete_queryset(instances)
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        if result["protected"]:
             return Response(
                 {
                     "error": "Cannot delete some records because they are protected.",
-                    "protected_objects": protected_ids,
+                    "protected_objects": result["protected"],
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        except Exception as e:
-            return Response(
-                {"error": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
         return Response(
             {"message": "Deleted successfully"}, status=status.HTTP_204_NO_CONTENT
         )
@@ -197,33 +503,50 @@ class MassActionMixin:
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        q_objects = Q()
-        for cond in conditions:
-            field = cond.get("field")
-            operator = cond.get("operator")
-            value = cond.get("value")
-            connector = cond.get("connector", "AND").upper()
-            app_label = payload.get("app_label")
-            model = payload.get("model")
-
-            if not field or not operator:
-                continue
-
-            lookup = OPERATOR_MAP.get(operator)
-            if not lookup:
-                continue
-
-            if operator in {"is empty", "not empty"}:
-                q = Q(**{f"{field}__{lookup}": operator == "is empty"})
-            elif operator in {"between", "not between"}:
-                q = Q(**{f"{field}__{lookup}": value})
-            else:
-                q = Q(**{f"{field}__{lookup}": value})
+        if payload.get("mode") == "file":
+            try:
+                record = Export.objects.create(
+                    name=payload.get("name") or f"{model} export",
+                    app_label=app_label,
+                    model=model,
+                    columns=columns,
+                    conditions=conditions,
+                )
+                task_id = dispatch_export(record, payload.get("partitions", 1))
+                return Response(
+                    {
+                        "status": "started",
+                        "task_id": task_id,
+                        "export_id": record.id,
+                        "name": f"Exporting {model}",
+                    },
+                    status=status.HTTP_202_ACCEPTED,
+                )
+            except Exception as e:
+                return Response(
+                    {"error": f"Error: {str(e)}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            if operator in NEGATE_OPERATORS:
-                q = ~q
+        if payload.get("mode") == "stream":
+            format = payload.get("format", "ndjson")
+            if format not in STREAM_FORMATS:
+                return Response(
+                    {"error": f"Unsupported stream format '{format}'."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = get_export_queryset(app_label, model, columns, conditions)
+            rows = astream_rows if is_asgi_request(request) else stream_rows
+            response = StreamingHttpResponse(
+                rows(queryset, get_export_columns(queryset), format),
+                content_type=STREAM_FORMATS[format],
+            )
+            response["Content-Disposition"] = (
+                f'attachment; filename="{model.lower()}.{format}"'
+            )
+            return response
 
-            q_objects = q_objects & q if connector == "AND" else q_objects | q
+        q_objects = build_condition_query(conditions)
 
         qs = (
             Model.objects.filter(q_objects).values(*columns)
@@ -239,10 +562,19 @@ class MassActionMixin:
         action_type = request.data.get("action")
         mappings = json.loads(request.data.get("mappings", "{}"))
         default_values = json.loads(request.data.get("defaultValues", "{}"))
+        create_related = json.loads(request.data.get("createRelated", "[]"))
         columns = json.loads(request.data.get("columns", "[]"))
         rows = json.loads(request.data.get("rows", "[]"))
         app_label = request.data.get("app_label")
         model = request.data.get("model")
+        key_field = request.data.get("key_field")
+        try:
+            shards = int(request.data.get("shards") or 1)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "'shards' must be a number."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         if not model:
             return Response(
@@ -256,25 +588,56 @@ class MassActionMixin:
                 {"error": f"Model '{model}' not found."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        fields = Model._meta.get_fields()
-        required_fields = [
-            f.name
-            for f in Model._meta.get_fields()
-            if (
-                (
-                    getattr(f, "editable", False)
-                    and hasattr(f, "blank")
-                    and hasattr(f, "null")
-                    and not f.blank
-                    and not f.null
-                    and not getattr(f, "auto_created", False)
-                    and (not hasattr(f, "default") or f.default is NOT_PROVIDED)
+        model_info = model_registry.get(Model)
+        required_fields = list(model_info.required_fields)
+        if action_type in ("update", "both"):
+            key_field = key_field or model_info.pk_name
+            try:
+                if not Model._meta.get_field(key_field).unique:
+                    raise FieldDoesNotExist
+            except FieldDoesNotExist:
+                return Response(
+                    {"error": f"'{key_field}' is not a unique field of {model}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if action_type == "update":
+                required_fields = []
+            if key_field not in required_fields:
+                required_fields.insert(0, key_field)
+        # ``<foreign key>__<field>`` mappings look related rows up by a field.
+        mapped_fields = set()
+        non_unique_lookups = []
+        for name in [*mappings, *default_values]:
+            try:
+                field, lookup = split_mapping(Model, name)
+            except FieldDoesNotExist:
+                return Response(
+                    {"error": f"'{name}' is not a field of {model}."},
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
-                or (action_type == "update" and f.name == Model._meta.pk.name)
+            if mappings.get(name) or default_values.get(name) not in (None, ""):
+                mapped_fields.add(field.name)
+                if lookup is not None and field.name in create_related:
+                    if not lookup.unique:
+                        non_unique_lookups.append(name)
+        # Shards run concurrently: rows with the same key in different shards
+        # would update in any order, and shards would each create the related
+        # rows a non-unique lookup misses.
+        if shards > 1 and action_type in ("update", "both"):
+            return Response(
+                {"error": "Only create imports can be sharded."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if shards > 1 and non_unique_lookups:
+            return Response(
+                {
+                    "error": "Sharded imports can only create related rows by "
+                    f"unique fields: {', '.join(non_unique_lookups)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        ]
         missing_required_fields = [
-            field for field in required_fields if not mappings.get(field)
+            field for field in required_fields if field not in mapped_fields
         ]
         if missing_required_fields:
             return Response(
@@ -284,7 +647,7 @@ class MassActionMixin:
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if action_type == "create":
+        if action_type in ("create", "update", "both"):
             try:
                 record = Import.objects.create(
                     app_label=app_label,
@@ -294,15 +657,15 @@ class MassActionMixin:
                     columns=columns,
                     mappings=mappings,
                     default_values=default_values,
+                    create_related=create_related,
                     action=action_type,
+                    key_field=key_field,
                 )
-                task = start_import.delay(app_label, model, record.id, required_fields)
-                record.task_id = task.id
-                record.save()
+                task_id = dispatch_import(record, required_fields, shards)
                 return Response(
                     {
                         "status": "started",
-                        "task_id": task.id,
+                        "task_id": task_id,
                         "name": f"Importing {model}",
                     },
                     status=status.HTTP_202_ACCEPTED,
@@ -312,11 +675,6 @@ class MassActionMixin:
                     {"error": f"Error: {str(e)}."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-        if action_type == "update":
-            pass
-        if action_type == "both":
-            pass
-
         return Response(
             {
                 "file_name": uploaded_file.name if uploaded_file else None,
@@ -331,6 +689,23 @@ class MassActionMixin:
 
     @action(detail=False, methods=["get"], url_path="status/(?P<task_id>[^/.]+)")
     def status(self, request, task_id=None):
+        # Tasks publish their progress (see common.progress); the result
+        # backend is only asked when no snapshot is cached.
+        snapshot = get_task_snapshot(task_id)
+        if snapshot is not None:
+            data = {
+                "task_id": task_id,
+                "status": (
+                    "PENDING"
+                    if snapshot["status"] == "PROGRESS"
+                    else snapshot["status"]
+                ),
+                "result": snapshot["result"],
+            }
+            if snapshot["status"] == "PROGRESS":
+                data["progress"] = snapshot["progress"]
+            return Response(data)
+
         res = AsyncResult(task_id, app=app)
         data = {
             "task_id": task_id,
@@ -350,10 +725,10 @@ class UserStampMixin:
     def set_user_stamps(self, validated_data):
         request = self.context.get("request", None)
         if request and hasattr(request, "user"):
-            model_fields = [f.name for f in self.Meta.model._meta.get_fields()]
-            if "created_by" in model_fields:
+            model_info = model_registry.get(self.Meta.model)
+            if model_info.has_created_by:
                 validated_data["created_by"] = request.user
-            if "updated_by" in model_fields:
+            if model_info.has_updated_by:
                 validated_data["updated_by"] = request.user
         return validated_data
 
@@ -364,8 +739,8 @@ class M2MValidationMixin:
         super().__init__(*args, **kwargs)
 
     def validate_many_to_many_fields(self, initial_data):
-        for field in self.Meta.model._meta.get_fields():
-            if field.is_relation and field.many_to_many and field.name in initial_data:
+        for field in model_registry.get(self.Meta.model).many_to_many_fields:
+            if field.name in initial_data:
                 self._validated_m2m_data[field.name] = (
                     self._validate_many_to_many_field(field, initial_data[field.name])
                 )
@@ -386,14 +761,48 @@ class M2MValidationMixin:
         )
 
 
+class FieldPlanMixin:
+    """
+    Builds a serializer's fields once per class and hands each instance a
+    deep copy, instead of re-deriving every ModelSerializer field per request.
+    """
+
+    _field_plans = {}
+
+    def get_fields(self):
+        cls = type(self)
+        plan = FieldPlanMixin._field_plans.get(cls)
+        if plan is None:
+            plan = FieldPlanMixin._field_plans[cls] = self.build_field_plan()
+        return copy.deepcopy(plan)
+
+    def build_field_plan(self):
+        return super().get_fields()
+
+
 class NestedRelationDisplayMixin:
+    _nested_serializers = {}
+
     def get_nested_serializer(self, field):
         related_model = field.related_model
+        serializer_class = NestedRelationDisplayMixin._nested_serializers.get(
+            related_model
+        )
+        if serializer_class is None:
+            serializer_class = self.build_nested_serializer(related_model)
+            NestedRelationDisplayMixin._nested_serializers[related_model] = (
+                serializer_class
+            )
+        return serializer_class
+
+    def build_nested_serializer(self, related_model):
         all_fields = [f.name for f in related_model._meta.fields]
         exclude_fields = {"password", "secret_key", "token"}
         safe_fields = [f for f in all_fields if f not in exclude_fields]
 
-        class serializer_class(serializers.ModelSerializer, DisplayNameMixin):
+        class serializer_class(
+            FieldPlanMixin, serializers.ModelSerializer, DisplayNameMixin
+        ):
             display_name = serializers.SerializerMethodField()
             module = serializers.SerializerMethodField()
             url = serializers.SerializerMethodField()
@@ -407,7 +816,92 @@ class NestedRelationDisplayMixin:
         return serializer_class
 
 
+def parse_field_list(value):
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def get_field_selection(request):
+    """
+    The ``(fields, omit, expand)`` requested through ?fields=, ?omit= and
+    ?expand= on a read request, or None when none of them is present.
+    ``expand`` is None when the param is absent, meaning expand everything.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    params = request.query_params
+    if not any(
+        name in params
+        for name in (
+            SparseFieldsMixin.fields_query_param,
+            SparseFieldsMixin.omit_query_param,
+            SparseFieldsMixin.expand_query_param,
+        )
+    ):
+        return None
+    expand = params.get(SparseFieldsMixin.expand_query_param)
+    return (
+        frozenset(parse_field_list(params.get(SparseFieldsMixin.fields_query_param))),
+        frozenset(parse_field_list(params.get(SparseFieldsMixin.omit_query_param))),
+        None if expand is None else frozenset(parse_field_list(expand)),
+    )
+
+
+class RelationReferenceSerializer(serializers.Serializer):
+    """Reference-only rendering of a relation that was not expanded."""
+
+    id = serializers.ReadOnlyField(source="pk")
+    display_name = serializers.SerializerMethodField()
+
+    def get_display_name(self, obj):
+        return str(obj)
+
+
+class SparseFieldsMixin:
+    """
+    Applies ?fields=, ?omit= and ?expand= to the top-level serializer of a
+    read request. Relations stay fully nested unless ?expand= is given, in
+    which case only the listed ones are and the rest render as
+    ``{id, display_name}``.
+    """
+
+    fields_query_param = "fields"
+    omit_query_param = "omit"
+    expand_query_param = "expand"
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.get_field_selection()
+        if selection is None:
+            return fields
+
+        only, omit, expand = selection
+        for name in list(fields):
+            field = fields[name]
+            if (only and name not in only) or name in omit:
+                del fields[name]
+            elif (
+                expand is not None
+                and name not in expand
+                and isinstance(field, serializers.BaseSerializer)
+            ):
+                fields[name] = RelationReferenceSerializer(
+                    many=isinstance(field, serializers.ListSerializer),
+                    read_only=True,
+                )
+        return fields
+
+    def get_field_selection(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None
+        return get_field_selection(self.context.get("request"))
+
+
 class DisplayNameMixin:
+    _url_templates = {}
+
     def get_display_name(self, obj):
         return str(obj)
 
@@ -415,6 +909,11 @@ class DisplayNameMixin:
         return obj.__class__.__name__
 
     def get_url(self, obj):
+        template = self.get_url_template(obj._meta.model)
+        if template is not None and isinstance(obj.pk, int):
+            return template.replace(URL_PK_PLACEHOLDER, str(obj.pk))
+        if template == "":
+            return ""
         try:
             url_name = f"{(obj._meta.model_name)}-detail"
             endpoint = str(reverse(url_name, kwargs={"pk": obj.pk}))
@@ -422,14 +921,55 @@ class DisplayNameMixin:
         except Exception:
             return ""
 
+    def get_url_template(self, model):
+        """
+        Detail URL for the model with a placeholder pk, reversed once per
+        model and script prefix. "" means the model has no detail route and
+        None means the route exists but could not be templated.
+        """
+        key = (model, get_script_prefix())
+        if key not in DisplayNameMixin._url_templates:
+            url_name = f"{model._meta.model_name}-detail"
+            try:
+                endpoint = str(reverse(url_name, kwargs={"pk": URL_PK_PLACEHOLDER}))
+                template = settings.FRONTEND_URL + endpoint
+            except NoReverseMatch:
+                template = (
+                    "" if not get_resolver().reverse_dict.getlist(url_name) else None
+                )
+            except Exception:
+                template = None
+            DisplayNameMixin._url_templates[key] = template
+        return DisplayNameMixin._url_templates[key]
+
 
 class PrevNextMixin:
+    @staticmethod
+    def annotate_prev_next(queryset):
+        model = queryset.model
+        return queryset.annotate(
+            _previous_id=Subquery(
+                model.objects.filter(id__lt=OuterRef("id"))
+                .order_by("-id")
+                .values("id")[:1]
+            ),
+            _next_id=Subquery(
+                model.objects.filter(id__gt=OuterRef("id"))
+                .order_by("id")
+                .values("id")[:1]
+            ),
+        )
+
     def get_previous_id(self, obj):
+        if hasattr(obj, "_previous_id"):
+            return obj._previous_id
         model = obj.__class__
         prev_record = model.objects.filter(id__lt=obj.id).order_by("-id").first()
         return prev_record.id if prev_record else None
 
     def get_next_id(self, obj):
+        if hasattr(obj, "_next_id"):
+            return obj._next_id
         model = obj.__class__
         next_record = model.objects.filter(id__gt=obj.id).order_by("id").first()
         return next_record.id if next_record else None
@@ -449,10 +989,9 @@ class FiltersetMixin:
     )
 
     def get_filterset_fields(self):
-        model = self.queryset.model
         return [
             f.name
-            for f in model._meta.get_fields()
+            for f in model_registry.get(self.queryset.model).fields
             if isinstance(getattr(f, "related_model", f), self.allowed_field_types)
         ]
 
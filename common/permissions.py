@@ -1,6 +1,14 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import transaction
 from rest_framework import permissions
 from rest_framework.permissions import BasePermission
 
+from common.cache import is_shared_cache
+
+PERMISSION_CACHE_TIMEOUT = getattr(settings, "PERMISSION_CACHE_TIMEOUT", 300)
+PERMISSION_GENERATION_KEY = "permissions:generation"
+
 action_permission_map = {
     "GET": "view",
     "POST": "add",
@@ -9,45 +17,106 @@ action_permission_map = {
 }
 
 
-class GroupPermission(BasePermission):
-    def has_permission(self, request, view):
-
-        action_permission = action_permission_map.get(request.method)
+def get_permission_generation():
+    return cache.get_or_set(PERMISSION_GENERATION_KEY, 1, None)
+
+
+def bump_permission_generation(using=None):
+    """
+    Invalidates every compiled permission set once the current transaction
+    commits, so a set compiled from the old rows meanwhile is never cached
+    under the new generation.
+    """
+
+    def bump():
+        try:
+            cache.incr(PERMISSION_GENERATION_KEY)
+        except ValueError:
+            cache.set(PERMISSION_GENERATION_KEY, 2, None)
+
+    transaction.on_commit(bump, using=using)
+
+
+def compile_permissions(user):
+    """
+    Returns the user's permission codenames grouped by source ("groups",
+    "roles" and "user"), each as a frozenset. The result is cached per user
+    until a group, role or permission changes, and memoized on the user
+    object for the rest of the request. Without a shared cache the sets are
+    compiled on every request, since a local cache would not hear of
+    revocations made by other processes.
+    """
+    compiled = getattr(user, "_compiled_permissions", None)
+    if compiled is not None:
+        return compiled
+    if not user.is_authenticated:
+        compiled = {"groups": frozenset(), "roles": frozenset(), "user": frozenset()}
+        user._compiled_permissions = compiled
+        return compiled
+
+    if is_shared_cache(DEFAULT_CACHE_ALIAS):
+        key = f"permissions:{get_permission_generation()}:{user.pk}"
+        compiled = cache.get(key)
+        if compiled is None:
+            compiled = load_permissions(user)
+            cache.set(key, compiled, PERMISSION_CACHE_TIMEOUT)
+    else:
+        compiled = load_permissions(user)
+    user._compiled_permissions = compiled
+    return compiled
+
+
+def load_permissions(user):
+    roles = getattr(user, "roles", None)
+    return {
+        "groups": frozenset(
+            user.groups.filter(permissions__isnull=False).values_list(
+                "permissions__codename", flat=True
+            )
+        ),
+        "roles": (
+            frozenset(
+                roles.filter(permissions__isnull=False).values_list(
+                    "permissions__codename", flat=True
+                )
+            )
+            if roles is not None
+            else frozenset()
+        ),
+        "user": frozenset(user.user_permissions.values_list("codename", flat=True)),
+    }
+
+
+def get_permission_scope(user):
+    compiled = compile_permissions(user)
+    codenames = sorted(set().union(*compiled.values()))
+    return [user.is_authenticated, user.is_superuser, codenames]
+
+
+def get_perm_codename(request, view):
+    action_permission = action_permission_map.get(request.method)
+    if action_permission:
         model_name = view.queryset.model.__name__
-        if action_permission:
-            perm_codename = f"{action_permission}_{model_name.lower()}"
-            user_groups = request.user.groups.all()
-            for group in user_groups:
-                if group.permissions.filter(codename=perm_codename).exists():
-                    return True
-        return False
+        return f"{action_permission}_{model_name.lower()}"
 
 
-class RolePermission(BasePermission):
+class GroupPermission(BasePermission):
+    sources = ("groups",)
+
     def has_permission(self, request, view):
-        action_permission = action_permission_map.get(request.method)
-        model_name = view.queryset.model.__name__
-        if action_permission:
-            perm_codename = f"{action_permission}_{model_name.lower()}"
-            user_roles = request.user.roles.all()
-            for role in user_roles:
-                if role.permissions.filter(codename=perm_codename).exists():
-                    return True
+        perm_codename = get_perm_codename(request, view)
+        if perm_codename:
+            compiled = compile_permissions(request.user)
+            return any(perm_codename in compiled[source] for source in self.sources)
         return False
 
 
-class GroupRolePermission(BasePermission):
-    def has_permission(self, request, view):
-        group_permission = GroupPermission()
-        role_permission = RolePermission()
-
-        if group_permission.has_permission(request, view):
-            return True
+class RolePermission(GroupPermission):
+    sources = ("roles",)
 
-        if role_permission.has_permission(request, view):
-            return True
 
-        return False
+class GroupRolePermission(GroupPermission):
+    sources = ("groups", "roles", "user")
 
 
 class IsOwnerReadOnly(permissions.BasePermission):
@@ -0,0 +1,189 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+from common.mixins import PrevNextMixin, get_field_selection
+
+QUERY_PLAN_CACHE_SIZE = getattr(settings, "QUERY_PLAN_CACHE_SIZE", 512)
+# Method fields that only read the primary key or annotations.
+PK_ONLY_METHOD_FIELDS = {"url", "module", "previous_id", "next_id"}
+
+# Related fields touched by a model's __str__, which feeds display_name.
+DISPLAY_RELATED = {
+    "auth.permission": ("content_type",),
+}
+
+
+# Columns read by a model's __str__, which feeds display_name.
+DISPLAY_FIELDS = {
+    "auth.group": ("name",),
+    "auth.permission": ("name",),
+}
+
+
+def get_display_related(model):
+    return getattr(
+        model, "DISPLAY_RELATED", DISPLAY_RELATED.get(model._meta.label_lower, ())
+    )
+
+
+def get_display_fields(model):
+    """The columns display_name reads from ``model``, None when unknown."""
+    fields = getattr(
+        model, "DISPLAY_FIELDS", DISPLAY_FIELDS.get(model._meta.label_lower)
+    )
+    if fields is None and model.__str__ is models.Model.__str__:
+        # The default __str__ only reads the primary key.
+        return ()
+    return fields
+
+
+class QueryPlan:
+    def __init__(
+        self,
+        select_related=(),
+        prefetch_related=(),
+        prev_next=False,
+        models=(),
+        only=(),
+    ):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.prev_next = prev_next
+        # Every model whose rows the serializer renders.
+        self.models = tuple(models)
+        self.only = tuple(only)
+
+    def apply(self, queryset):
+        if self.only:
+            queryset = queryset.only(*self.only)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.prev_next:
+            queryset = PrevNextMixin.annotate_prev_next(queryset)
+        return queryset
+
+
+class QueryPlanner:
+    """
+    Derives select_related/prefetch_related paths from the relations a
+    serializer renders, so list endpoints run a fixed number of queries
+    whatever the page size. Plans are cached per serializer class, model and
+    the ?fields=/?omit=/?expand= selection of the request, if any.
+    """
+
+    def __init__(self):
+        self._plans = {}
+
+    def get_plan(self, serializer_class, model, request=None):
+        selection = get_field_selection(request)
+        key = (serializer_class, model, selection)
+        plan = self._plans.get(key)
+        if plan is None:
+            if len(self._plans) >= QUERY_PLAN_CACHE_SIZE:
+                self._plans.clear()
+            context = {"request": request} if selection is not None else {}
+            plan = self._plans[key] = self.build_plan(
+                serializer_class(context=context), model
+            )
+        return plan
+
+    def build_plan(self, serializer, model):
+        select_related, prefetch_related, models = [], [], [model]
+        self.walk(
+            serializer, model, "", False, select_related, prefetch_related, models
+        )
+        for name in get_display_related(model):
+            select_related.append(name)
+            models.append(model._meta.get_field(name).related_model)
+
+        fields = serializer.fields
+        prev_next = (
+            isinstance(serializer, PrevNextMixin)
+            and "previous_id" in fields
+            and "next_id" in fields
+        )
+        return QueryPlan(
+            dict.fromkeys(select_related),
+            dict.fromkeys(prefetch_related),
+            prev_next,
+            dict.fromkeys(models),
+            self.get_only_fields(serializer, model),
+        )
+
+    def get_only_fields(self, serializer, model):
+        """
+        The columns the serializer reads from ``model``, for ``only()``, or
+        () when a field may read anything (custom methods, or display_name of
+        a model whose display fields are unknown).
+        """
+        columns = [model._meta.pk.name, *get_display_related(model)]
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if name in PK_ONLY_METHOD_FIELDS:
+                    continue
+                display_fields = get_display_fields(model)
+                if name != "display_name" or display_fields is None:
+                    return ()
+                columns.extend(display_fields)
+                continue
+            if field.source == "*" or "." in field.source:
+                return ()
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return ()
+            if model_field.concrete and not model_field.many_to_many:
+                columns.append(model_field.name)
+        return dict.fromkeys(columns)
+
+    def walk(self, serializer, model, prefix, prefetched, select, prefetch, models):
+        for field in serializer.fields.values():
+            if field.write_only or field.source == "*" or "." in field.source:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if not model_field.is_relation:
+                continue
+
+            path = f"{prefix}{model_field.name}"
+            many = model_field.many_to_many or model_field.one_to_many
+            if isinstance(field, serializers.ListSerializer):
+                nested = field.child
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = field
+            elif isinstance(field, serializers.ManyRelatedField):
+                prefetch.append(path)
+                if model_field.many_to_many:
+                    models.append(model_field.remote_field.through)
+                continue
+            else:
+                continue
+
+            related_model = model_field.related_model
+            in_prefetch = prefetched or many
+            (prefetch if in_prefetch else select).append(path)
+            models.append(related_model)
+            for name in get_display_related(related_model):
+                (prefetch if in_prefetch else select).append(f"{path}__{name}")
+                models.append(related_model._meta.get_field(name).related_model)
+            if isinstance(nested, serializers.Serializer):
+                self.walk(
+                    nested,
+                    related_model,
+                    f"{path}__",
+                    in_prefetch,
+                    select,
+                    prefetch,
+                    models,
+                )
+
+
+query_planner = QueryPlanner()
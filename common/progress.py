@@ -0,0 +1,128 @@
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+from common.cache import is_shared_cache
+
+PROGRESS_INTERVAL = getattr(settings, "TASK_PROGRESS_INTERVAL", 1.0)
+# Most progress events pushed to WebSocket subscribers per second and task.
+PROGRESS_PUSH_RATE = getattr(settings, "TASK_PROGRESS_PUSH_RATE", 4)
+PROGRESS_SNAPSHOT_TIMEOUT = getattr(settings, "TASK_PROGRESS_SNAPSHOT_TIMEOUT", 3600)
+FINAL_STATES = ("SUCCESS", "FAILURE")
+# Close code telling WebSocket clients to poll the status action instead.
+PUSH_UNAVAILABLE_CODE = 4503
+
+
+def get_task_group(task_id):
+    return f"task-{task_id}"
+
+
+def get_snapshot_key(task_id):
+    return f"task-progress:{task_id}"
+
+
+def get_push_layer():
+    """
+    The channel layer progress is pushed through, or None when a worker
+    process cannot reach the ASGI server through it (no or in-memory layer).
+    """
+    layer = get_channel_layer()
+    if layer is None or isinstance(layer, InMemoryChannelLayer):
+        return None
+    return layer
+
+
+def has_snapshots():
+    # Snapshots written by a worker are only seen through a shared cache.
+    return is_shared_cache(DEFAULT_CACHE_ALIAS)
+
+
+def get_task_snapshot(task_id):
+    """The last event published for ``task_id``, or None."""
+    if not has_snapshots():
+        return None
+    return cache.get(get_snapshot_key(task_id))
+
+
+def publish_task_event(task_id, event):
+    """
+    Stores ``event`` as the task's snapshot and sends it to the task's
+    channel group, for the TaskProgressConsumer subscribers. Either step is
+    skipped when its backend is local to the process (see settings).
+    """
+    if has_snapshots():
+        cache.set(get_snapshot_key(task_id), event, PROGRESS_SNAPSHOT_TIMEOUT)
+    layer = get_push_layer()
+    if layer is not None:
+        async_to_sync(layer.group_send)(
+            get_task_group(task_id), {"type": "task.event", "event": event}
+        )
+
+
+def make_task_event(task_id, status, current=0, total=0, errors=0, result=None):
+    return {
+        "task_id": task_id,
+        "status": status,
+        "current": current,
+        "total": total,
+        "progress": round(current / (total or 1) * 100, 2),
+        "errors": errors,
+        "result": result,
+    }
+
+
+class TaskProgress:
+    """
+    Rate-limited wrapper around ``task.update_state`` for the status action,
+    which also pushes progress to WebSocket subscribers at most
+    PROGRESS_PUSH_RATE times a second. ``task_id`` lets a subtask report on
+    behalf of the task clients follow.
+    """
+
+    def __init__(self, task, total, interval=PROGRESS_INTERVAL, task_id=None):
+        self.task = task
+        self.total = total
+        self.interval = interval
+        self.push_interval = 1 / PROGRESS_PUSH_RATE
+        self.task_id = task_id
+        self.last_update = 0.0
+        self.last_push = 0.0
+        self.errors = 0
+
+    def get_task_id(self):
+        return self.task_id or self.task.request.id
+
+    def update(self, current, force=False, errors=None):
+        if errors is not None:
+            self.errors = errors
+        self.total = max(self.total, current)
+        now = time.monotonic()
+        if force or now - self.last_push >= self.push_interval:
+            self.last_push = now
+            publish_task_event(
+                self.get_task_id(),
+                make_task_event(
+                    self.get_task_id(), "PROGRESS", current, self.total, self.errors
+                ),
+            )
+        if not force and now - self.last_update < self.interval:
+            return
+        self.last_update = now
+        self.task.update_state(
+            task_id=self.task_id,
+            state="PENDING",
+            meta={"current": current, "total": self.total},
+        )
+
+    def finish(self, current, result=None, status="SUCCESS"):
+        """Publishes the completion event; the result backend has the rest."""
+        self.total = max(self.total, current)
+        publish_task_event(
+            self.get_task_id(),
+            make_task_event(
+                self.get_task_id(), status, current, self.total, self.errors, result
+            ),
+        )
@@ -0,0 +1,162 @@
+from django.apps import apps
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.db import models
+from django.db.models.fields import NOT_PROVIDED
+
+SEARCH_FIELD_TYPES = ["CharField", "TextField", "EmailField", "SlugField", "UUIDField"]
+TEXT_SEARCH_FIELD_CLASSES = (
+    models.CharField,
+    models.TextField,
+    models.EmailField,
+    models.URLField,
+    models.SlugField,
+    models.DateField,
+    models.DateTimeField,
+    models.TimeField,
+    models.BigAutoField,
+)
+
+
+class ModelInfo:
+    """
+    Field introspection for a single model, computed once and shared by
+    viewsets, serializers, filtersets and the import task. Treat every
+    attribute as read-only.
+    """
+
+    def __init__(self, model):
+        opts = model._meta
+        self.model = model
+        self.fields = tuple(opts.get_fields())
+        self.field_names = frozenset(f.name for f in self.fields)
+        self.concrete_fields = tuple(opts.fields)
+        self.pk_name = opts.pk.name
+
+        self.fk_fields = tuple(
+            f
+            for f in opts.fields
+            if isinstance(f, (models.ForeignKey, models.OneToOneField))
+        )
+        self.m2m_fields = tuple(opts.many_to_many)
+        self.relation_fields = tuple(
+            f for f in self.fields if f.is_relation and (f.many_to_one or f.one_to_one)
+        )
+        self.many_to_many_fields = tuple(
+            f for f in self.fields if f.is_relation and f.many_to_many
+        )
+
+        self.search_fields = [
+            f.name
+            for f in self.fields
+            if hasattr(f, "get_internal_type")
+            and f.get_internal_type() in SEARCH_FIELD_TYPES
+        ]
+        self.text_search_fields = [
+            f.name for f in opts.fields if isinstance(f, TEXT_SEARCH_FIELD_CLASSES)
+        ]
+        self.filterset_fields = [
+            f.name
+            for f in self.fields
+            if isinstance(f, models.Field)
+            and not f.many_to_many
+            and not f.one_to_many
+            and not isinstance(f, models.JSONField)
+        ]
+        self.required_fields = [
+            f.name
+            for f in self.fields
+            if (
+                getattr(f, "editable", False)
+                and hasattr(f, "blank")
+                and hasattr(f, "null")
+                and not f.blank
+                and not f.null
+                and not getattr(f, "auto_created", False)
+                and (not hasattr(f, "default") or f.default is NOT_PROVIDED)
+            )
+        ]
+
+        self.has_created_by = "created_by" in self.field_names
+        self.has_updated_by = "updated_by" in self.field_names
+
+        self.schema = self.build_schema()
+        self.field_metadata = self.build_field_metadata()
+        self.field_summary = [
+            {
+                "name": f.name,
+                "null": getattr(f, "null", None),
+                "primary_key": getattr(f, "primary_key", False),
+            }
+            for f in self.fields
+            if not isinstance(f, (models.ManyToOneRel, models.ManyToManyRel))
+        ]
+
+    def build_schema(self):
+        model = self.model
+        schema = {
+            "title": f"{model.__name__} schema",
+            "description": f"Schema for {model.__name__}",
+            "type": "object",
+            "properties": {},
+            "required": [],
+        }
+        for field in self.fields:
+            if isinstance(field, (models.ManyToOneRel, models.ManyToManyRel)):
+                continue
+
+            if isinstance(field, GenericForeignKey):
+                continue
+
+            field_info = {
+                "title": field.verbose_name.title(),
+                "type": field.get_internal_type(),
+                "nullable": getattr(field, "null", False),
+                "blank": getattr(field, "blank", False),
+            }
+
+            if not field.null and not field.blank and not field.primary_key:
+                schema["required"].append(field.name)
+
+            if field.primary_key:
+                field_info["type"] = "string"
+
+            schema["properties"][field.name] = field_info
+
+        return schema
+
+    def build_field_metadata(self):
+        field_metadata = []
+        for field in self.fields:
+            if not field.is_relation or (field.is_relation and not field.auto_created):
+                related_model = (
+                    getattr(field.related_model, "__name__", None)
+                    if hasattr(field, "related_model")
+                    else None
+                )
+                field_info = {
+                    "name": field.name,
+                    "type": type(field).__name__,
+                    "null": getattr(field, "null", None),
+                    "primary_key": getattr(field, "primary_key", False),
+                    "related_model": related_model,
+                }
+                field_metadata.append(field_info)
+        return field_metadata
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+
+    def build(self):
+        for model in apps.get_models():
+            self._models[model] = ModelInfo(model)
+
+    def get(self, model):
+        info = self._models.get(model)
+        if info is None:
+            info = self._models[model] = ModelInfo(model)
+        return info
+
+
+model_registry = ModelRegistry()
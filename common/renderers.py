@@ -0,0 +1,143 @@
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_RESULTS_THRESHOLD = getattr(settings, "STREAM_RESULTS_THRESHOLD", 100)
+STREAM_BATCH_SIZE = getattr(settings, "STREAM_BATCH_SIZE", 50)
+
+_encoder = encoders.JSONEncoder()
+
+
+def default(obj):
+    # datetimes are passed through so they keep DRF's format (millisecond
+    # precision, "Z" for UTC); Decimals honour COERCE_DECIMAL_TO_STRING.
+    return _encoder.default(obj)
+
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(data):
+        """Compact UTF-8 JSON bytes, encoded by orjson."""
+        return orjson.dumps(data, default=default, option=OPTIONS)
+
+else:
+
+    def dumps(data):
+        """Compact UTF-8 JSON bytes, encoded by the standard library."""
+        return json.dumps(
+            data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+
+def is_asgi_request(request):
+    """
+    Whether ``request`` (a Django or DRF request) is served over ASGI, where
+    streaming responses need an async iterator: the ASGI handler reads sync
+    ones to the end before sending the first byte.
+    """
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed. Output is
+    byte-for-byte what the stock renderer produces for compact UTF-8 JSON;
+    indented or ASCII-only output falls back to the stock renderer.
+    """
+
+    def use_fallback(self, accepted_media_type, renderer_context):
+        return (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.use_fallback(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return self.encode(data)
+
+    def encode(self, data):
+        # Same escaping of U+2028 and U+2029 as the stock renderer.
+        return (
+            dumps(data)
+            .replace("\u2028".encode(), b"\\u2028")
+            .replace("\u2029".encode(), b"\\u2029")
+        )
+
+
+class IncrementalJSONRenderer(FastJSONRenderer):
+    """
+    Renders like FastJSONRenderer, but a response whose ``results`` list is
+    large can be streamed instead: the envelope is written around the
+    items, which are encoded and sent in batches rather than as one
+    document.
+    """
+
+    def should_stream(self, data, accepted_media_type=None, renderer_context=None):
+        return (
+            isinstance(data, dict)
+            and isinstance(data.get("results"), list)
+            and len(data["results"]) >= STREAM_RESULTS_THRESHOLD
+            and not self.use_fallback(accepted_media_type, renderer_context)
+        )
+
+    def iter_render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Yields the same bytes ``render`` would return, in pieces. Keys keep
+        their order, so the envelope matches the non-streamed response.
+        """
+        yield b"{"
+        for index, (key, value) in enumerate(data.items()):
+            prefix = (b"," if index else b"") + self.encode(str(key)) + b":"
+            if key != "results":
+                yield prefix + self.encode(value)
+                continue
+            yield prefix + b"["
+            for start in range(0, len(value), STREAM_BATCH_SIZE):
+                batch = value[start : start + STREAM_BATCH_SIZE]
+                yield (b"," if start else b"") + b",".join(
+                    self.encode(item) for item in batch
+                )
+            yield b"]"
+        yield b"}"
+
+    async def aiter_render(self, data, accepted_media_type=None, renderer_context=None):
+        """``iter_render`` for ASGI, handing each piece to the server as it is encoded."""
+        for piece in self.iter_render(data, accepted_media_type, renderer_context):
+            yield piece
+
+    def stream_response(self, response, request=None):
+        """
+        Turns a DRF response that has not been rendered into a streaming
+        one, with an async iterator when ``request`` came in over ASGI.
+        """
+        iter_render = (
+            self.aiter_render if is_asgi_request(request) else self.iter_render
+        )
+        streaming = StreamingHttpResponse(
+            iter_render(
+                response.data,
+                response.accepted_media_type,
+                response.renderer_context,
+            ),
+            status=response.status_code,
+            content_type=response.accepted_media_type,
+        )
+        for name, value in response.items():
+            if name.lower() != "content-type":
+                streaming[name] = value
+        return streaming
@@ -0,0 +1,42 @@
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.urls import path
+
+from common.consumers import TaskProgressConsumer
+
+websocket_urlpatterns = [
+    path("ws/tasks/<str:task_id>/", TaskProgressConsumer.as_asgi()),
+]
+
+
+@database_sync_to_async
+def get_token_user(key):
+    from rest_framework.authtoken.models import Token
+
+    try:
+        return Token.objects.select_related("user").get(key=key).user
+    except Token.DoesNotExist:
+        return None
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Browsers cannot set headers on WebSocket requests, so API token clients
+    pass ``?token=<key>``. Session users are resolved by AuthMiddlewareStack.
+    """
+
+    async def __call__(self, scope, receive, send):
+        params = parse_qs(scope.get("query_string", b"").decode())
+        key = params.get("token", [None])[0]
+        if key:
+            user = await get_token_user(key)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
+
+
+def TokenAuthMiddlewareStack(inner):
+    return AuthMiddlewareStack(TokenAuthMiddleware(inner))
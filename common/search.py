@@ -0,0 +1,239 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from common.globals import ALLOWED_VIEWS
+from common.registry import model_registry
+from common.trigram import (
+    TRIGRAM_MIN_LENGTH,
+    SQLiteTrigramBackend,
+    get_trigram_backend,
+    get_trigram_fields,
+)
+from core.models import SearchDocument
+
+SEARCH_INDEX_BATCH_SIZE = getattr(settings, "SEARCH_INDEX_BATCH_SIZE", 1000)
+SEARCH_RESULTS_PER_MODEL = getattr(settings, "SEARCH_RESULTS_PER_MODEL", 10)
+SEARCH_MAX_RESULTS_PER_MODEL = getattr(settings, "SEARCH_MAX_RESULTS_PER_MODEL", 100)
+SEARCH_TIME_BUDGET = getattr(settings, "SEARCH_TIME_BUDGET", 2.0)
+SEARCH_MAX_WORKERS = getattr(settings, "SEARCH_MAX_WORKERS", 4)
+
+
+def get_search_models():
+    return [model for model in apps.get_models() if model.__name__ in ALLOWED_VIEWS]
+
+
+def is_indexed(model):
+    return model.__name__ in ALLOWED_VIEWS
+
+
+def get_terms(query):
+    return re.findall(r"\w+", query or "")
+
+
+def build_document(instance):
+    values = (
+        getattr(instance, name)
+        for name in model_registry.get(type(instance)).text_search_fields
+    )
+    return " ".join(str(value) for value in values if value not in (None, ""))
+
+
+class SearchBackend:
+    """
+    Keeps one SearchDocument row per indexed object, holding the text of
+    its searchable fields. Subclasses only decide how ``search`` queries
+    those documents.
+    """
+
+    def index(self, instances):
+        documents = [
+            SearchDocument(
+                model=instance._meta.label_lower,
+                object_id=str(instance.pk),
+                body=build_document(instance),
+            )
+            for instance in instances
+        ]
+        SearchDocument.objects.bulk_create(
+            documents,
+            batch_size=SEARCH_INDEX_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["model", "object_id"],
+            update_fields=["body"],
+        )
+
+    def reindex(self, model, pks):
+        if not is_indexed(model):
+            return
+        pks = list(pks)
+        for i in range(0, len(pks), SEARCH_INDEX_BATCH_SIZE):
+            self.index(
+                model.objects.filter(pk__in=pks[i : i + SEARCH_INDEX_BATCH_SIZE])
+            )
+
+    def remove(self, model, pks):
+        pks = [str(pk) for pk in pks]
+        for i in range(0, len(pks), SEARCH_INDEX_BATCH_SIZE):
+            SearchDocument.objects.filter(
+                model=model._meta.label_lower,
+                object_id__in=pks[i : i + SEARCH_INDEX_BATCH_SIZE],
+            ).delete()
+
+    def clear(self, model):
+        SearchDocument.objects.filter(model=model._meta.label_lower).delete()
+
+    def search(self, query, model, limit=None, offset=0):
+        """
+        Returns the ids (as strings) of ``model`` documents matching every
+        term of ``query``, best matches first.
+        """
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Non-indexed fallback for databases without full-text support: every
+    query scans the model's documents with icontains, one term at a time.
+    """
+
+    def search(self, query, model, limit=None, offset=0):
+        terms = get_terms(query)
+        if not terms:
+            return []
+        queryset = SearchDocument.objects.filter(model=model._meta.label_lower)
+        for term in terms:
+            queryset = queryset.filter(body__icontains=term)
+        queryset = queryset.order_by("pk").values_list("object_id", flat=True)
+        end = offset + limit if limit is not None else None
+        return list(queryset[offset:end])
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Prefix matching through the FTS5 shadow table, ranked by bm25. For models
+    with TRIGRAM_FIELDS, objects whose trigram fields contain every term
+    mid-word ("nab" in "Annabel") follow the ranked hits; those come from the
+    trigram FTS5 table, so terms shorter than a trigram only match prefixes.
+    """
+
+    def search(self, query, model, limit=None, offset=0):
+        terms = get_terms(query)
+        if not terms:
+            return []
+        label = model._meta.label_lower
+        sql = (
+            "SELECT d.object_id, 0 AS tier, f.rank AS rank, d.id AS id "
+            "FROM core_searchdocument_fts f "
+            "JOIN core_searchdocument d ON d.id = f.rowid "
+            "WHERE core_searchdocument_fts MATCH %s AND d.model = %s"
+        )
+        params = [" ".join(f'"{term}"*' for term in terms), label]
+        if self.has_substring_index(model, terms):
+            contains = (
+                "SELECT t.object_id FROM core_trigramdocument_fts tf "
+                "JOIN core_trigramdocument t ON t.id = tf.rowid "
+                "WHERE core_trigramdocument_fts MATCH %s AND t.model = %s"
+            )
+            sql += (
+                " UNION ALL SELECT d.object_id, 1, 0, d.id "
+                "FROM core_searchdocument d WHERE d.model = %s"
+                + "".join(f" AND d.object_id IN ({contains})" for _ in terms)
+            )
+            params.append(label)
+            for term in terms:
+                params.extend([f'"{term}"', label])
+        with connections[SearchDocument.objects.db].cursor() as cursor:
+            cursor.execute(
+                f"SELECT object_id FROM ({sql}) GROUP BY object_id "
+                "ORDER BY MIN(tier), MIN(rank), MIN(id) LIMIT %s OFFSET %s",
+                [*params, -1 if limit is None else limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def has_substring_index(self, model, terms):
+        return (
+            isinstance(get_trigram_backend(), SQLiteTrigramBackend)
+            and bool(get_trigram_fields(model))
+            and all(len(term) >= TRIGRAM_MIN_LENGTH for term in terms)
+        )
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "SEARCH_BACKEND", None)
+        if path:
+            _backend = import_string(path)()
+        elif connections[SearchDocument.objects.db].vendor == "sqlite":
+            _backend = SQLiteSearchBackend()
+        else:
+            _backend = DatabaseSearchBackend()
+    return _backend
+
+
+def get_matched_field(instance, terms):
+    terms = [term.lower() for term in terms]
+    for name in model_registry.get(type(instance)).text_search_fields:
+        value = getattr(instance, name)
+        if value is not None and any(term in str(value).lower() for term in terms):
+            return name
+    return None
+
+
+def search_model(query, model, limit, offset=0):
+    """
+    Top ``limit`` hits for one model, starting at ``offset``, as
+    lightweight dicts, plus whether more hits follow.
+    """
+    try:
+        ids = get_search_backend().search(query, model, limit + 1, offset)
+        objects = {
+            str(pk): obj for pk, obj in model.objects.in_bulk(ids[:limit]).items()
+        }
+    finally:
+        # Worker threads open their own connections.
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    terms = get_terms(query)
+    hits = [
+        {
+            "id": obj.pk,
+            "display_name": str(obj),
+            "matched_field": get_matched_field(obj, terms),
+        }
+        for obj in (objects.get(object_id) for object_id in ids[:limit])
+        if obj is not None
+    ]
+    return hits, len(ids) > limit
+
+
+def search_all(query, models, limit, offset=0, budget=SEARCH_TIME_BUDGET):
+    """
+    Runs ``search_model`` for every model concurrently. Models that miss
+    the ``budget`` (seconds) map to None instead of holding the response.
+    """
+    results = dict.fromkeys(models)
+    if not models:
+        return results
+    executor = ThreadPoolExecutor(max_workers=min(len(models), SEARCH_MAX_WORKERS))
+    futures = {
+        executor.submit(search_model, query, model, limit, offset): model
+        for model in models
+    }
+    try:
+        for future in as_completed(futures, timeout=budget):
+            results[futures[future]] = future.result()
+    except TimeoutError:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
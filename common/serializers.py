@@ -1,15 +1,19 @@
 from common.mixins import (
     DisplayNameMixin,
+    FieldPlanMixin,
     M2MValidationMixin,
     NestedRelationDisplayMixin,
     PrevNextMixin,
+    SparseFieldsMixin,
     UserStampMixin,
 )
-from django.db import models
+from common.registry import model_registry
 from rest_framework import serializers
 
 
 class BaseSerializer(
+    SparseFieldsMixin,
+    FieldPlanMixin,
     NestedRelationDisplayMixin,
     M2MValidationMixin,
     UserStampMixin,
@@ -25,32 +29,31 @@ class BaseSerializer(
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.m2m_fields = [f for f in self.Meta.model._meta.many_to_many]
-        self.fk_fields = [
-            f
-            for f in self.Meta.model._meta.fields
-            if (isinstance(f, models.ForeignKey) or isinstance(f, models.OneToOneField))
-        ]
-        for field in self.m2m_fields + self.fk_fields:
+        model_info = model_registry.get(self.Meta.model)
+        self.m2m_fields = list(model_info.m2m_fields)
+        self.fk_fields = list(model_info.fk_fields)
+
+    def build_field_plan(self):
+        fields = super().build_field_plan()
+        model_info = model_registry.get(self.Meta.model)
+        for field in model_info.m2m_fields + model_info.fk_fields:
             serializer_cls = self.get_nested_serializer(field)
-            self.fields[field.name] = serializer_cls(
-                many=field.many_to_many, read_only=True
-            )
+            fields[field.name] = serializer_cls(many=field.many_to_many, read_only=True)
+        return fields
 
     def validate(self, attrs):
         self.validate_many_to_many_fields(self.initial_data)
 
-        for field in self.Meta.model._meta.get_fields():
-            if field.is_relation and (field.many_to_one or field.one_to_one):
-                if field.name in self.initial_data:
-                    try:
-                        attrs[field.name] = field.related_model.objects.get(
-                            id=self.initial_data[field.name]
-                        )
-                    except field.related_model.DoesNotExist:
-                        raise serializers.ValidationError(
-                            {field.name: f"Invalid {field.related_model.__name__} ID."}
-                        )
+        for field in model_registry.get(self.Meta.model).relation_fields:
+            if field.name in self.initial_data:
+                try:
+                    attrs[field.name] = field.related_model.objects.get(
+                        id=self.initial_data[field.name]
+                    )
+                except field.related_model.DoesNotExist:
+                    raise serializers.ValidationError(
+                        {field.name: f"Invalid {field.related_model.__name__} ID."}
+                    )
 
         return super().validate(attrs)
 
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal
+
+from common.cache import bump_model_version
+from common.counts import adjust_total_count
+from common.permissions import bump_permission_generation
+from common.search import get_search_backend, get_search_models
+from common.trigram import get_trigram_backend, get_trigram_models
+
+# Sent with the model as sender and the affected ``pks`` after bulk writes
+# (queryset updates, bulk_create/bulk_update) that bypass post_save.
+rows_changed = Signal()
+
+
+def invalidate_permissions(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        bump_permission_generation(using=kwargs.get("using"))
+
+
+def connect_permission_signals():
+    User = get_user_model()
+    m2m_fields = [Group.permissions, User.groups, User.user_permissions]
+    models = [Group, Permission]
+
+    # Roles are optional; only wired up when the user model has them.
+    roles = getattr(User, "roles", None)
+    if roles is not None:
+        Role = roles.rel.related_model if roles.reverse else roles.field.related_model
+        m2m_fields += [roles, Role.permissions]
+        models.append(Role)
+
+    for field in m2m_fields:
+        m2m_changed.connect(invalidate_permissions, sender=field.through, weak=False)
+    for model in models:
+        post_save.connect(invalidate_permissions, sender=model, weak=False)
+        post_delete.connect(invalidate_permissions, sender=model, weak=False)
+
+
+def index_instance(sender, instance, **kwargs):
+    get_search_backend().index([instance])
+
+
+def unindex_instance(sender, instance, **kwargs):
+    get_search_backend().remove(sender, [instance.pk])
+
+
+def reindex_rows(sender, pks, **kwargs):
+    get_search_backend().reindex(sender, pks)
+
+
+def connect_search_signals():
+    for model in get_search_models():
+        post_save.connect(index_instance, sender=model, weak=False)
+        post_delete.connect(unindex_instance, sender=model, weak=False)
+        rows_changed.connect(reindex_rows, sender=model, weak=False)
+
+
+def trigram_index_instance(sender, instance, **kwargs):
+    get_trigram_backend().index([instance])
+
+
+def trigram_unindex_instance(sender, instance, **kwargs):
+    get_trigram_backend().remove(sender, [instance.pk])
+
+
+def trigram_reindex_rows(sender, pks, **kwargs):
+    get_trigram_backend().reindex(sender, pks)
+
+
+def connect_trigram_signals():
+    for model in get_trigram_models():
+        post_save.connect(trigram_index_instance, sender=model, weak=False)
+        post_delete.connect(trigram_unindex_instance, sender=model, weak=False)
+        rows_changed.connect(trigram_reindex_rows, sender=model, weak=False)
+
+
+def bump_instance_version(sender, **kwargs):
+    bump_model_version(sender, using=kwargs.get("using"))
+
+
+def bump_m2m_versions(sender, instance, action, model, **kwargs):
+    if action.startswith("post_"):
+        using = kwargs.get("using")
+        for changed in (sender, type(instance), model):
+            bump_model_version(changed, using=using)
+
+
+def count_instance_saved(sender, created=False, **kwargs):
+    if created:
+        adjust_total_count(sender, 1, using=kwargs.get("using"))
+
+
+def count_instance_deleted(sender, **kwargs):
+    adjust_total_count(sender, -1, using=kwargs.get("using"))
+
+
+def connect_count_signals():
+    post_save.connect(count_instance_saved, weak=False)
+    post_delete.connect(count_instance_deleted, weak=False)
+
+
+def connect_version_signals():
+    post_save.connect(bump_instance_version, weak=False)
+    post_delete.connect(bump_instance_version, weak=False)
+    m2m_changed.connect(bump_m2m_versions, weak=False)
@@ -1,53 +1,352 @@
-import io
+import csv
+import shutil
+import tempfile
+import uuid
 
-import pandas as pd
-from celery import shared_task
+from celery import chord, shared_task
+from celery.signals import task_failure
 from django.apps import apps
-from django.core.files.base import ContentFile
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F
 
-from core.models import Import
+from common.cache import bump_model_version
+from common.deletion import BulkDeleter
+from common.exporter import (
+    get_export_columns,
+    get_export_queryset,
+    get_partition_ranges,
+    write_csv,
+)
+from common.importer import (
+    RESULT_COLUMNS,
+    BulkImporter,
+    count_rows,
+    get_shard_ranges,
+    read_chunks,
+)
+from common.progress import TaskProgress, make_task_event, publish_task_event
+from common.signals import rows_changed
+from core.models import Export, Import
+
+
+def get_importer(record, Model, required_fields):
+    return BulkImporter(
+        Model,
+        record.mappings,
+        required_fields,
+        record.key_field,
+        default_values=record.default_values,
+        create_related=record.create_related or (),
+    )
+
+
+def import_rows(importer, Model, action, chunk, start):
+    if action == "create":
+        results = importer.import_chunk(chunk, start)
+    else:
+        results = importer.upsert_chunk(chunk, start, create_missing=action == "both")
+    # Bulk writes send no post_save; the importer bumps the model version.
+    rows_changed.send(
+        sender=Model,
+        pks=[r["message"] for r in results if r["status"] == "success"],
+    )
+    return results
+
+
+def save_part(buffer, import_id, shard):
+    buffer.seek(0)
+    return default_storage.save(
+        f"imports/parts/rows_{import_id}_{shard}.csv", File(buffer)
+    )
+
+
+def dispatch_import(record, required_fields, shards=1):
+    """
+    Starts the import job for ``record`` and returns the task id clients
+    poll. Sharded imports first split the file into one file per range of
+    chunks, then run one task per file and a chord callback that merges
+    their results; the callback id is the one reported.
+    """
+    record.total_rows = count_rows(record.file.path)
+    record.imported_rows = record.error_rows = 0
+    ranges = get_shard_ranges(record.total_rows, shards)
+    task_id = str(uuid.uuid4())
+    record.task_id = task_id
+    record.save()
+
+    args = (record.app_label, record.model, record.id, required_fields)
+    if len(ranges) == 1:
+        start_import.apply_async(args, task_id=task_id)
+    else:
+        bounds = [lower for lower, _ in ranges]
+        split_import.delay(record.id, required_fields, bounds, task_id)
+    return task_id
 
 
 @shared_task(bind=True)
 def start_import(self, app_label, model_name, id, required_fields):
     Model = apps.get_model(app_label, model_name)
     record = Import.objects.get(pk=id)
-    df = pd.read_csv(record.file.path, dtype=str, low_memory=False)
-    df = df.dropna(how="all").replace(r"^\s*$", None, regex=True).dropna(how="all")
-    rows = df.to_dict(orient="records")
     action = record.action
-    mappings = record.mappings
 
-    results = []
-    if action == "create":
-        total = len(rows)
-        for idx, row in enumerate(rows, start=1):
-            self.update_state(state="PENDING", meta={"current": idx, "total": total})
-            missing = [
-                field
-                for field in required_fields
-                if pd.isna(row.get(mappings[field]))
-                or str(row.get(mappings[field])).strip() == ""
-            ]
-            if missing:
-                results.append(
-                    {
-                        "row": idx,
-                        "status": "error",
-                        "message": f"Missing required fields: {', '.join(missing)}",
-                    }
-                )
-                continue
-            try:
-                values = {field: row[col] for field, col in mappings.items()}
-                obj = Model.objects.create(**values)
-                results.append({"row": idx, "status": "success", "message": obj.id})
-            except Exception as e:
-                results.append({"row": idx, "status": "error", "message": str(e)})
-    results_df = pd.DataFrame(results)
-    print(results_df)
-    buffer = io.StringIO()
-    results_df.to_csv(buffer, index=False)
-    buffer.seek(0)
-    record.results.save(f"results_{record.id}.csv", ContentFile(buffer.getvalue()))
+    importer = get_importer(record, Model, required_fields)
+    progress = TaskProgress(self, count_rows(record.file.path))
+    summary = {"total": 0, "success": 0, "error": 0}
+
+    with tempfile.TemporaryFile("w+", newline="") as buffer:
+        writer = csv.DictWriter(buffer, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        if action in ("create", "update", "both"):
+            for chunk in read_chunks(record.file.path):
+                start = summary["total"] + 1
+                results = import_rows(importer, Model, action, chunk, start)
+                writer.writerows(results)
+                summary["total"] += len(chunk)
+                for result in results:
+                    summary[result["status"]] += 1
+                progress.update(summary["total"], errors=summary["error"])
+        progress.update(summary["total"], force=True, errors=summary["error"])
+
+        buffer.seek(0)
+        record.results.save(f"results_{record.id}.csv", File(buffer))
+    record.save()
+    progress.finish(summary["total"], summary)
+    return summary
+
+
+@shared_task(bind=True)
+def split_import(self, import_id, required_fields, bounds, progress_task_id):
+    """
+    Parses the file once, writing the chunks from each of ``bounds`` (the
+    first chunk index of every shard) to a file of their own, and starts
+    one ``import_shard`` per file along with the row number it starts at.
+    """
+    record = Import.objects.get(pk=import_id)
+    parts = []
+    rows = 0
+    buffer = None
+    try:
+        for index, chunk in enumerate(read_chunks(record.file.path)):
+            if len(parts) < len(bounds) and index == bounds[len(parts)]:
+                if buffer is not None:
+                    parts[-1]["name"] = save_part(buffer, import_id, len(parts) - 1)
+                buffer = tempfile.TemporaryFile("w+", newline="")
+                parts.append({"start": rows + 1})
+            chunk.to_csv(buffer, index=False, header=buffer.tell() == 0)
+            rows += len(chunk)
+        if buffer is not None:
+            parts[-1]["name"] = save_part(buffer, import_id, len(parts) - 1)
+    finally:
+        if buffer is not None:
+            buffer.close()
+
+    callback = finish_import.s(import_id).set(task_id=progress_task_id)
+    if not parts:
+        callback.delay([])
+        return
+    chord(
+        import_shard.s(
+            import_id,
+            required_fields,
+            shard,
+            part["name"],
+            part["start"],
+            progress_task_id,
+        )
+        for shard, part in enumerate(parts)
+    )(callback)
+
+
+@shared_task(bind=True)
+def import_shard(
+    self, import_id, required_fields, shard, name, start, progress_task_id
+):
+    """
+    Imports the rows ``split_import`` wrote to ``name``, numbering them from
+    ``start`` so they match an unsharded import.
+    """
+    record = Import.objects.get(pk=import_id)
+    Model = apps.get_model(record.app_label, record.model)
+    importer = get_importer(record, Model, required_fields)
+    progress = TaskProgress(self, record.total_rows, task_id=progress_task_id)
+    summary = {"total": 0, "success": 0, "error": 0}
+
+    with tempfile.TemporaryFile("w+", newline="") as buffer:
+        writer = csv.DictWriter(buffer, fieldnames=RESULT_COLUMNS)
+        if shard == 0:
+            writer.writeheader()
+        for chunk in read_chunks(default_storage.path(name)):
+            results = import_rows(
+                importer, Model, record.action, chunk, start + summary["total"]
+            )
+            writer.writerows(results)
+            errors = sum(result["status"] == "error" for result in results)
+            summary["total"] += len(chunk)
+            summary["success"] += len(results) - errors
+            summary["error"] += errors
+            Import.objects.filter(pk=import_id).update(
+                imported_rows=F("imported_rows") + len(chunk),
+                error_rows=F("error_rows") + errors,
+            )
+            bump_model_version(Import)
+            current, failed = Import.objects.values_list(
+                "imported_rows", "error_rows"
+            ).get(pk=import_id)
+            progress.update(current, errors=failed)
+        default_storage.delete(name)
+        buffer.seek(0)
+        name = default_storage.save(
+            f"imports/parts/results_{import_id}_{shard}.csv", File(buffer)
+        )
+    return {"name": name, **summary}
+
+
+@shared_task(bind=True)
+def finish_import(self, shard_results, import_id):
+    record = Import.objects.get(pk=import_id)
+    summary = {"total": 0, "success": 0, "error": 0}
+    with tempfile.TemporaryFile("w+b") as buffer:
+        for part in shard_results:
+            with default_storage.open(part["name"], "rb") as results:
+                shutil.copyfileobj(results, buffer)
+            default_storage.delete(part["name"])
+            for key in summary:
+                summary[key] += part[key]
+        buffer.seek(0)
+        record.results.save(f"results_{record.id}.csv", File(buffer))
+    progress = TaskProgress(self, record.total_rows)
+    progress.update(summary["total"], force=True, errors=summary["error"])
+    progress.finish(summary["total"], summary)
+    return summary
+
+
+@shared_task(bind=True)
+def start_delete(self, app_label, model_name, pks):
+    Model = apps.get_model(app_label, model_name)
+    progress = TaskProgress(self, len(pks))
+    deleted = 0
+
+    def on_progress(rows):
+        nonlocal deleted
+        deleted += rows
+        progress.update(deleted)
+
+    result = BulkDeleter(Model).delete_pks(pks, on_progress=on_progress)
+    progress.update(deleted, force=True, errors=len(result["protected"]))
+    progress.finish(deleted, result)
+    return result
+
+
+def dispatch_export(record, partitions=1):
+    """
+    Starts the export job for ``record`` and returns the task id clients
+    poll. Partitioned exports run one task per pk range and a chord callback
+    that concatenates the parts; the callback id is the one reported.
+    """
+    queryset = get_export_queryset(
+        record.app_label, record.model, record.columns, record.conditions
+    )
+    record.total_rows = queryset.count()
+    record.exported_rows = 0
+    ranges = get_partition_ranges(queryset, partitions)
+    task_id = str(uuid.uuid4())
+    record.task_id = task_id
     record.save()
+
+    if len(ranges) == 1:
+        start_export.apply_async((record.id,), task_id=task_id)
+    else:
+        chord(
+            export_partition.s(record.id, part, lower, upper, task_id)
+            for part, (lower, upper) in enumerate(ranges)
+        )(finish_export.s(record.id).set(task_id=task_id))
+    return task_id
+
+
+@shared_task(bind=True)
+def start_export(self, export_id):
+    record = Export.objects.get(pk=export_id)
+    queryset = get_export_queryset(
+        record.app_label, record.model, record.columns, record.conditions
+    ).order_by("pk")
+    columns = get_export_columns(queryset)
+    progress = TaskProgress(self, record.total_rows)
+    exported = 0
+
+    def on_progress(rows):
+        nonlocal exported
+        exported += rows
+        progress.update(exported)
+
+    with tempfile.TemporaryFile("w+", newline="") as buffer:
+        write_csv(queryset, buffer, columns, on_progress=on_progress)
+        progress.update(exported, force=True)
+        buffer.seek(0)
+        record.exported_rows = exported
+        record.file.save(f"export_{record.id}.csv", File(buffer))
+    progress.finish(exported, {"total": exported})
+    return {"total": exported}
+
+
+@shared_task(bind=True)
+def export_partition(self, export_id, part, lower, upper, progress_task_id):
+    record = Export.objects.get(pk=export_id)
+    queryset = get_export_queryset(
+        record.app_label, record.model, record.columns, record.conditions
+    )
+    columns = get_export_columns(queryset)
+    queryset = queryset.filter(pk__gte=lower, pk__lt=upper).order_by("pk")
+    progress = TaskProgress(self, record.total_rows, task_id=progress_task_id)
+
+    def on_progress(rows):
+        Export.objects.filter(pk=export_id).update(
+            exported_rows=F("exported_rows") + rows
+        )
+        bump_model_version(Export)
+        current = Export.objects.values_list("exported_rows", flat=True).get(
+            pk=export_id
+        )
+        progress.update(current)
+
+    with tempfile.TemporaryFile("w+", newline="") as buffer:
+        write_csv(queryset, buffer, columns, header=part == 0, on_progress=on_progress)
+        buffer.seek(0)
+        return default_storage.save(
+            f"exports/parts/export_{export_id}_{part}.csv", File(buffer)
+        )
+
+
+@shared_task(bind=True)
+def finish_export(self, part_names, export_id):
+    record = Export.objects.get(pk=export_id)
+    with tempfile.TemporaryFile("w+b") as buffer:
+        for name in part_names:
+            with default_storage.open(name, "rb") as part:
+                shutil.copyfileobj(part, buffer)
+            default_storage.delete(name)
+        buffer.seek(0)
+        record.file.save(f"export_{record.id}.csv", File(buffer))
+    record.refresh_from_db(fields=["exported_rows"])
+    result = {"total": record.exported_rows}
+    TaskProgress(self, record.total_rows).finish(record.exported_rows, result)
+    return result
+
+
+@task_failure.connect
+def publish_task_failure(sender=None, task_id=None, exception=None, args=(), **kw):
+    """Tells WebSocket subscribers that a task they follow failed."""
+    if sender in (export_partition, split_import, import_shard):
+        # Partitions and shards report on behalf of the chord callback.
+        task_id = args[-1]
+    elif sender not in (
+        start_import,
+        finish_import,
+        start_delete,
+        start_export,
+        finish_export,
+    ):
+        return
+    publish_task_event(
+        task_id, make_task_event(task_id, "FAILURE", result=str(exception))
+    )
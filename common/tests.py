@@ -1,3 +1,562 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+from unittest import mock
+from urllib.parse import parse_qsl, urlsplit
 
-# Create your tests here.
+import pandas as pd
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import Group
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.celery import app
+
+from common.cache import is_response_cache_enabled, is_shared_cache
+from common.counts import CachedCountProvider, invalidate_total_count
+from common.consumers import TaskProgressConsumer
+from common.importer import BulkImporter, read_chunks
+from common.progress import (
+    PUSH_UNAVAILABLE_CODE,
+    get_task_snapshot,
+    make_task_event,
+    publish_task_event,
+)
+from common.renderers import STREAM_RESULTS_THRESHOLD
+from common.tasks import split_import
+from core.models import Export, Import
+from core.views import ExportViewSet
+from djauth.models import User
+from djauth.views import UserViewSet
+
+
+class SharedCacheMixin:
+    """Runs the test against a cache every process could share."""
+
+    def setUp(self):
+        super().setUp()
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        backend = "django.core.cache.backends.filebased.FileBasedCache"
+        self.enterContext(
+            override_settings(
+                CACHES={"default": {"BACKEND": backend, "LOCATION": location}}
+            )
+        )
+
+
+def make_export(name, **fields):
+    return Export.objects.create(
+        name=name, model="user", app_label="djauth", columns=[], conditions=[], **fields
+    )
+
+
+class UpsertImportTests(TestCase):
+    mappings = {"id": "ID", "name": "Name", "model": "Model"}
+
+    def upsert(self, rows, create_missing=False, **options):
+        importer = BulkImporter(
+            Export, self.mappings, ["model", "app_label"], "id", **options
+        )
+        df = pd.DataFrame(rows, columns=["ID", "Name", "Model"], dtype=object)
+        return importer.upsert_chunk(df, 1, create_missing=create_missing)
+
+    def test_changed_rows_are_written_and_stamped(self):
+        export = make_export("before")
+        unchanged = make_export("same")
+        results = self.upsert(
+            [[str(export.pk), "after", "user"], [str(unchanged.pk), "same", "user"]]
+        )
+
+        self.assertEqual([r["status"] for r in results], ["success", "success"])
+        updated = Export.objects.get(pk=export.pk)
+        self.assertEqual(updated.name, "after")
+        self.assertGreater(updated.updated_at, export.updated_at)
+        self.assertEqual(
+            Export.objects.get(pk=unchanged.pk).updated_at, unchanged.updated_at
+        )
+
+    def test_blank_cells_keep_existing_values(self):
+        export = make_export("kept")
+        self.upsert([[str(export.pk), None, "group"]])
+
+        export.refresh_from_db()
+        self.assertEqual(export.name, "kept")
+        self.assertEqual(export.model, "group")
+
+    def test_default_values_apply_to_updates(self):
+        export = make_export("named")
+        self.upsert(
+            [[str(export.pk), None, None]],
+            default_values={"name": "default", "app_label": "auth"},
+        )
+
+        export.refresh_from_db()
+        self.assertEqual((export.name, export.app_label), ("default", "auth"))
+
+    def test_missing_keys_need_create_missing(self):
+        results = self.upsert([["999999", "new", "user"]])
+        self.assertEqual(results[0]["status"], "error")
+        self.assertFalse(Export.objects.filter(name="new").exists())
+
+        results = self.upsert(
+            [["999999", "new", "user"]],
+            create_missing=True,
+            default_values={"app_label": "djauth", "columns": ["id"], "conditions": {}},
+        )
+        self.assertEqual(results[0]["status"], "success")
+        created = Export.objects.get(pk=999999)
+        self.assertEqual((created.name, created.columns), ("new", ["id"]))
+
+    def test_last_duplicate_key_wins(self):
+        export = make_export("first")
+        results = self.upsert(
+            [[str(export.pk), "second", "user"], [str(export.pk), "third", "user"]]
+        )
+
+        self.assertEqual(results[0]["status"], "error")
+        self.assertEqual(results[1]["status"], "success")
+        export.refresh_from_db()
+        self.assertEqual(export.name, "third")
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user("cached@x.com", "secret", username="cached")
+
+    def test_local_memory_cache_disables_response_cache(self):
+        self.assertFalse(is_shared_cache())
+        self.assertFalse(is_response_cache_enabled())
+        self.client.get("/users/")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/users/")
+        self.assertTrue(queries.captured_queries)
+
+
+class SharedResponseCacheTests(SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user("cached@x.com", "secret", username="cached")
+
+    def test_shared_cache_serves_repeated_lists(self):
+        self.assertTrue(is_response_cache_enabled())
+        first = self.client.get("/users/").json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/users/").json(), first)
+
+
+def bulk_create_export(name):
+    # Sends no post_save, like a bulk write made by another process.
+    Export.objects.bulk_create(
+        [Export(name=name, model="user", app_label="djauth", columns=[], conditions=[])]
+    )
+
+
+class CachedCountTests(TestCase):
+    def test_counts_are_exact_without_a_shared_cache(self):
+        provider = CachedCountProvider()
+        self.assertEqual(provider.count(Export.objects.all()), 0)
+        bulk_create_export("bulk")
+        self.assertEqual(provider.count(Export.objects.all()), 1)
+
+
+class SharedCachedCountTests(SharedCacheMixin, TestCase):
+    def test_totals_are_cached_until_invalidated(self):
+        provider = CachedCountProvider()
+        self.assertEqual(provider.count(Export.objects.all()), 0)
+        bulk_create_export("bulk")
+        self.assertEqual(provider.count(Export.objects.all()), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_total_count(Export)
+        self.assertEqual(provider.count(Export.objects.all()), 1)
+
+
+def connect_to_progress(user, task_id):
+    """The first two messages the progress consumer sends on connect."""
+    scope = {
+        "type": "websocket",
+        "path": f"/ws/tasks/{task_id}/",
+        "headers": [],
+        "subprotocols": [],
+        "user": user,
+        "url_route": {"kwargs": {"task_id": task_id}},
+    }
+
+    async def connect():
+        communicator = ApplicationCommunicator(TaskProgressConsumer.as_asgi(), scope)
+        await communicator.send_input({"type": "websocket.connect"})
+        messages = [await communicator.receive_output(1) for _ in range(2)]
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait(1)
+        return messages
+
+    return async_to_sync(connect)()
+
+
+class TaskProgressTests(TestCase):
+    def test_no_snapshots_without_a_shared_cache(self):
+        publish_task_event("local", make_task_event("local", "PROGRESS", 1, 2))
+        self.assertIsNone(get_task_snapshot("local"))
+
+    def test_in_memory_layer_makes_clients_poll(self):
+        user = User.objects.create_user("ws@x.com", "secret", username="ws")
+        accepted, closed = connect_to_progress(user, "local")
+        self.assertEqual(accepted["type"], "websocket.accept")
+        self.assertEqual(closed["type"], "websocket.close")
+        self.assertEqual(closed["code"], PUSH_UNAVAILABLE_CODE)
+
+
+class SharedTaskProgressTests(SharedCacheMixin, TestCase):
+    def test_snapshots_are_stored(self):
+        event = make_task_event("shared", "PROGRESS", 1, 2)
+        publish_task_event("shared", event)
+        self.assertEqual(get_task_snapshot("shared"), event)
+
+
+class ShardedImportTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(
+            override_settings(
+                MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())
+            )
+        )
+        self.addCleanup(
+            setattr, app.conf, "task_always_eager", app.conf.task_always_eager
+        )
+        app.conf.task_always_eager = True
+        self.parsed = []
+
+        def read_small_chunks(path):
+            for chunk in read_chunks(path, chunk_size=2):
+                self.parsed.append(len(chunk))
+                yield chunk
+
+        self.enterContext(mock.patch("common.tasks.read_chunks", read_small_chunks))
+
+    def test_file_is_parsed_once_per_shard(self):
+        content = (
+            'Name,Model\none,user\n"two\nlines",user\nthree,\nfour,user\nfive,user\n'
+        )
+        record = Import.objects.create(
+            model="export",
+            app_label="core",
+            columns=["Name", "Model"],
+            mappings={"name": "Name", "model": "Model"},
+            default_values={"app_label": "djauth", "columns": [], "conditions": {}},
+            file=ContentFile(content, name="rows.csv"),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            split_import.delay(record.id, ["model"], [0, 1, 2], "sharded")
+
+        # Three chunks to split the file, then each shard reads its own.
+        self.assertEqual(self.parsed, [2, 2, 1, 2, 2, 1])
+        record.refresh_from_db()
+        with record.results.open("r") as results:
+            rows = list(csv.DictReader(results))
+        self.assertEqual(
+            [(row["row"], row["status"]) for row in rows],
+            [
+                ("1", "success"),
+                ("2", "success"),
+                ("3", "error"),
+                ("4", "success"),
+                ("5", "success"),
+            ],
+        )
+        self.assertEqual(
+            sorted(Export.objects.values_list("name", flat=True)),
+            ["five", "four", "one", "two\nlines"],
+        )
+        self.assertEqual(default_storage.listdir("imports/parts")[1], [])
+
+    def post_import(self, action, **data):
+        user = User.objects.create_superuser("shards@x.com", "secret")
+        request = APIRequestFactory().post(
+            "/exports/import/",
+            {
+                "file": SimpleUploadedFile("rows.csv", b"Name\none\n"),
+                "action": action,
+                "app_label": "core",
+                "model": "export",
+                "shards": 2,
+                **data,
+            },
+        )
+        force_authenticate(request, user)
+        return ExportViewSet.as_view({"post": "import_data"})(request)
+
+    def test_only_creates_are_sharded(self):
+        response = self.post_import("update", key_field="id", mappings='{"id": "Name"}')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "Only create imports can be sharded.")
+
+    def test_related_rows_are_created_by_unique_fields(self):
+        response = self.post_import(
+            "create",
+            mappings='{"name": "Name", "created_by__first_name": "Name"}',
+            createRelated='["created_by"]',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("created_by__first_name", response.data["error"])
+
+
+class DisplayNameOnlyTests(TestCase):
+    def retrieve(self, viewset, pk):
+        request = APIRequestFactory().get("/", {"fields": "id,display_name"})
+        with CaptureQueriesContext(connection) as queries:
+            response = viewset.as_view({"get": "retrieve"})(request, pk=pk)
+        self.assertEqual(response.status_code, 200)
+        return response.data["data"], queries[0]["sql"]
+
+    def test_display_fields_are_loaded_alone(self):
+        user = User.objects.create_user(
+            "ann@x.com", "secret", username="ann", first_name="Ann", last_name="Lee"
+        )
+        data, sql = self.retrieve(UserViewSet, user.pk)
+        self.assertEqual(data["display_name"], "Ann Lee")
+        self.assertIn('"last_name"', sql)
+        self.assertNotIn('"password"', sql)
+
+    def test_default_str_only_needs_the_pk(self):
+        export = make_export("plain")
+        data, sql = self.retrieve(ExportViewSet, export.pk)
+        self.assertEqual(data["display_name"], str(export))
+        self.assertNotIn('"conditions"', sql)
+
+
+def get_results(viewset, params):
+    request = APIRequestFactory().get("/", params)
+    response = viewset.as_view({"get": "list"})(request)
+    response.render()
+    return json.loads(response.content)
+
+
+def follow(link):
+    return dict(parse_qsl(urlsplit(link).query))
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ["b", None, "a", "b", None, "c", "a"]:
+            make_export(name)
+        exports = Export.objects.all()
+        self.expected = [e.pk for e in sorted(exports, key=lambda e: e.pk)]
+        self.expected_by_name = [
+            e.pk
+            for e in sorted(exports, key=lambda e: (e.name is None, e.name or "", e.pk))
+        ]
+
+    def walk(self, viewset, **params):
+        params = {"pagination": "cursor", "page_size": 2, **params}
+        pages = [get_results(viewset, params)]
+        while pages[-1]["next"]:
+            pages.append(get_results(viewset, follow(pages[-1]["next"])))
+        backwards = [pages[-1]]
+        while backwards[-1]["previous"]:
+            backwards.append(get_results(viewset, follow(backwards[-1]["previous"])))
+        forward = [row["id"] for page in pages for row in page["results"]]
+        backward = [
+            row["id"] for page in reversed(backwards) for row in page["results"]
+        ]
+        return forward, backward
+
+    def test_pages_cover_every_row_once(self):
+        forward, backward = self.walk(ExportViewSet)
+        self.assertEqual(forward, self.expected)
+        self.assertEqual(backward, self.expected)
+
+    def test_nulls_and_ties_in_the_ordering(self):
+        for ordering in ["name", "-name"]:
+            with self.subTest(ordering=ordering):
+                forward, backward = self.walk(ExportViewSet, ordering=ordering)
+                expected = self.expected_by_name
+                if ordering == "-name":
+                    # Descending keeps NULLs last and breaks ties by -pk.
+                    named = [pk for pk in expected if Export.objects.get(pk=pk).name]
+                    nulls = [pk for pk in expected if pk not in named]
+                    expected = named[::-1] + nulls[::-1]
+                self.assertEqual(forward, expected)
+                self.assertEqual(backward, expected)
+
+    def test_values_rows_are_paginated_alike(self):
+        for i in range(5):
+            User.objects.create_user(f"u{i}@x.com", "secret", username=f"u{i}")
+        forward, backward = self.walk(UserViewSet, ordering="email")
+        expected = list(User.objects.order_by("email").values_list("pk", flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        request = APIRequestFactory().get(
+            "/", {"pagination": "cursor", "cursor": "not-a-cursor"}
+        )
+        response = ExportViewSet.as_view({"get": "list"})(request)
+        self.assertEqual(response.status_code, 404)
+
+
+class SerializerUserViewSet(UserViewSet):
+    values_fast_path = False
+
+
+class ValuesFastPathTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        group = Group.objects.create(name="staff")
+        for i in range(3):
+            user = User.objects.create_user(
+                f"v{i}@x.com",
+                "secret",
+                username=f"v{i}",
+                first_name=f"V{i}" if i else "",
+                dob="2000-01-0{}".format(i + 1),
+                preferences={"theme": "dark"} if i else None,
+            )
+            if i:
+                user.groups.add(group)
+
+    def test_output_matches_the_serializer(self):
+        for params in [
+            {},
+            {"ordering": "-email"},
+            {"pagination": "cursor", "page_size": 2},
+            {"fields": "id,email,display_name,groups"},
+            {"omit": "groups"},
+            {"expand": "groups"},
+        ]:
+            with self.subTest(params=params):
+                results = get_results(UserViewSet, params)
+                self.assertTrue(results["results"])
+                self.assertEqual(results, get_results(SerializerUserViewSet, params))
+
+    def test_fast_path_is_taken(self):
+        with mock.patch.object(
+            UserViewSet, "list_values", side_effect=AssertionError
+        ) as list_values:
+            with self.assertRaises(AssertionError):
+                get_results(UserViewSet, {})
+        list_values.assert_called_once()
+
+
+class MassUpdateConditionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser("mass@x.com", "secret")
+        make_export("first")
+        make_export("second")
+
+    def mass_update(self, conditions):
+        request = APIRequestFactory().put(
+            "/exports/mass-update/",
+            {"conditions": conditions, "data": {"name": "changed"}},
+            format="json",
+        )
+        force_authenticate(request, self.user)
+        return ExportViewSet.as_view({"put": "mass_update"})(request)
+
+    def test_bad_conditions_change_nothing(self):
+        for conditions in [
+            [{"field": "name", "operator": "typo", "value": "first"}],
+            [{"operator": "is", "value": "first"}],
+            [{"field": "name", "operator": "is", "value": "x", "connector": "XOR"}],
+            [{"field": "nope", "operator": "is", "value": "first"}],
+            ["name"],
+            {"field": "name"},
+        ]:
+            with self.subTest(conditions=conditions):
+                self.assertEqual(self.mass_update(conditions).status_code, 400)
+                self.assertFalse(Export.objects.filter(name="changed").exists())
+
+    def test_valid_conditions_update_matching_rows(self):
+        response = self.mass_update(
+            [{"field": "name", "operator": "is", "value": "first"}]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(Export.objects.values_list("name", flat=True)), ["changed", "second"]
+        )
+
+
+def read_streaming(response):
+    """The body of a streaming response, consumed the way its server would."""
+    if not response.is_async:
+        return b"".join(response.streaming_content)
+
+    async def read():
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    return async_to_sync(read)()
+
+
+class StreamedExportTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser("stream@x.com", "secret")
+        for name in ["first", "second", "third"]:
+            make_export(name)
+
+    def export(self, factory):
+        data = {
+            "app_label": "core",
+            "model": "export",
+            "columns": ["id", "name"],
+            "mode": "stream",
+            "format": "csv",
+        }
+        request = factory.post(
+            "/exports/export/", {"data": data}, content_type="application/json"
+        )
+        force_authenticate(request, self.user)
+        return ExportViewSet.as_view({"post": "export_data"})(request)
+
+    def test_asgi_requests_get_an_async_stream(self):
+        wsgi = self.export(RequestFactory())
+        asgi = self.export(AsyncRequestFactory())
+        self.assertFalse(wsgi.is_async)
+        self.assertTrue(asgi.is_async)
+
+        body = read_streaming(asgi)
+        self.assertEqual(body, read_streaming(wsgi))
+        self.assertEqual(body.decode().splitlines()[0], "id,name")
+        self.assertEqual(len(body.decode().splitlines()), 4)
+
+
+class StreamedListTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        Export.objects.bulk_create(
+            Export(
+                name=f"e{i}",
+                model="user",
+                app_label="djauth",
+                columns=[],
+                conditions=[],
+            )
+            for i in range(STREAM_RESULTS_THRESHOLD)
+        )
+
+    def list(self, factory):
+        request = factory.get("/exports/", {"page_size": STREAM_RESULTS_THRESHOLD})
+        return ExportViewSet.as_view({"get": "list"})(request)
+
+    def test_asgi_requests_get_an_async_stream(self):
+        wsgi = self.list(RequestFactory())
+        asgi = self.list(AsyncRequestFactory())
+        self.assertFalse(wsgi.is_async)
+        self.assertTrue(asgi.is_async)
+
+        body = read_streaming(asgi)
+        self.assertEqual(body, read_streaming(wsgi))
+        self.assertEqual(len(json.loads(body)["results"]), STREAM_RESULTS_THRESHOLD)
@@ -0,0 +1,152 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from core.models import TrigramDocument
+
+TRIGRAM_FIELDS = getattr(settings, "TRIGRAM_FIELDS", {})
+TRIGRAM_BATCH_SIZE = getattr(settings, "TRIGRAM_BATCH_SIZE", 1000)
+# Trigram indexes cannot answer substring queries shorter than a trigram.
+TRIGRAM_MIN_LENGTH = 3
+
+
+def get_trigram_fields(model):
+    return tuple(
+        getattr(
+            model, "TRIGRAM_FIELDS", TRIGRAM_FIELDS.get(model._meta.label_lower, ())
+        )
+    )
+
+
+def get_trigram_models():
+    return [model for model in apps.get_models() if get_trigram_fields(model)]
+
+
+class TrigramBackend:
+    """
+    Optional substring index for the fields listed in TRIGRAM_FIELDS (or a
+    model's TRIGRAM_FIELDS attribute). ``match`` returns a Q that answers
+    ``field__icontains=term`` from the index, or None when the plain lookup
+    should be used. The base backend indexes nothing.
+    """
+
+    def setup(self, model):
+        pass
+
+    def index(self, instances):
+        pass
+
+    def reindex(self, model, pks):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def clear(self, model):
+        pass
+
+    def match(self, model, field, term):
+        return None
+
+
+class SQLiteTrigramBackend(TrigramBackend):
+    """
+    Keeps one TrigramDocument row per object and field, mirrored into an
+    FTS5 table with the trigram tokenizer, and matches terms against it.
+    """
+
+    def index(self, instances):
+        documents = [
+            TrigramDocument(
+                model=instance._meta.label_lower,
+                field=name,
+                object_id=str(instance.pk),
+                value=(
+                    ""
+                    if getattr(instance, name) is None
+                    else str(getattr(instance, name))
+                ),
+            )
+            for instance in instances
+            for name in get_trigram_fields(type(instance))
+        ]
+        TrigramDocument.objects.bulk_create(
+            documents,
+            batch_size=TRIGRAM_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["model", "field", "object_id"],
+            update_fields=["value"],
+        )
+
+    def reindex(self, model, pks):
+        if not get_trigram_fields(model):
+            return
+        pks = list(pks)
+        for i in range(0, len(pks), TRIGRAM_BATCH_SIZE):
+            self.index(model.objects.filter(pk__in=pks[i : i + TRIGRAM_BATCH_SIZE]))
+
+    def remove(self, model, pks):
+        pks = [str(pk) for pk in pks]
+        for i in range(0, len(pks), TRIGRAM_BATCH_SIZE):
+            TrigramDocument.objects.filter(
+                model=model._meta.label_lower,
+                object_id__in=pks[i : i + TRIGRAM_BATCH_SIZE],
+            ).delete()
+
+    def clear(self, model):
+        TrigramDocument.objects.filter(model=model._meta.label_lower).delete()
+
+    def match(self, model, field, term):
+        if len(term) < TRIGRAM_MIN_LENGTH or field not in get_trigram_fields(model):
+            return None
+        escaped = term.replace('"', '""')
+        phrase = f'"{escaped}"'
+        return Q(
+            pk__in=RawSQL(
+                "SELECT d.object_id FROM core_trigramdocument_fts f "
+                "JOIN core_trigramdocument d ON d.id = f.rowid "
+                "WHERE core_trigramdocument_fts MATCH %s "
+                "AND d.model = %s AND d.field = %s",
+                [phrase, model._meta.label_lower, field],
+            )
+        )
+
+
+class PostgresTrigramBackend(TrigramBackend):
+    """
+    pg_trgm GIN indexes on the columns themselves. PostgreSQL maintains them
+    and uses them for icontains directly, so no rewrite is needed.
+    """
+
+    def setup(self, model):
+        table = model._meta.db_table
+        with connections[model.objects.db].cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for name in get_trigram_fields(model):
+                column = model._meta.get_field(name).column
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{table}_{column}_trgm" '
+                    f'ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+                )
+
+
+_backend = None
+
+
+def get_trigram_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "TRIGRAM_BACKEND", None)
+        vendor = connections[TrigramDocument.objects.db].vendor
+        if path:
+            _backend = import_string(path)()
+        elif vendor == "sqlite":
+            _backend = SQLiteTrigramBackend()
+        elif vendor == "postgresql":
+            _backend = PostgresTrigramBackend()
+        else:
+            _backend = TrigramBackend()
+    return _backend
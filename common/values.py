@@ -0,0 +1,330 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+
+from common.mixins import PrevNextMixin, get_field_selection
+from common.planner import QUERY_PLAN_CACHE_SIZE, get_display_related
+
+# Method fields answered by calling the serializer's own method on an
+# instance built from the row, and method fields read from annotations.
+INSTANCE_METHOD_FIELDS = {"display_name", "module", "url"}
+ANNOTATION_METHOD_FIELDS = {"previous_id": "_previous_id", "next_id": "_next_id"}
+
+CONVERTED_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.FloatField,
+    serializers.DecimalField,
+    serializers.BooleanField,
+    serializers.DateTimeField,
+    serializers.DateField,
+    serializers.TimeField,
+    serializers.DurationField,
+    serializers.UUIDField,
+    serializers.ChoiceField,
+    serializers.JSONField,
+    serializers.ReadOnlyField,
+)
+# DRF field / model field pairs whose to_representation returns the
+# database value unchanged.
+IDENTITY_FIELDS = (
+    (serializers.ReadOnlyField, models.Field),
+    (serializers.CharField, (models.CharField, models.TextField)),
+    (serializers.IntegerField, models.IntegerField),
+    (serializers.BooleanField, models.BooleanField),
+)
+
+
+class Unsupported(Exception):
+    pass
+
+
+def get_converter(field, model_field):
+    for field_class, model_field_class in IDENTITY_FIELDS:
+        if isinstance(field, field_class) and isinstance(
+            model_field, model_field_class
+        ):
+            return None
+    return field.to_representation
+
+
+def make_column_getter(key, converter):
+    if converter is None:
+        return lambda row, instance, related: row[key]
+
+    def getter(row, instance, related):
+        value = row[key]
+        return None if value is None else converter(value)
+
+    return getter
+
+
+def make_method_getter(method):
+    return lambda row, instance, related: method(instance)
+
+
+def make_nested_getter(key, node):
+    def getter(row, instance, related):
+        return None if row[key] is None else node.render(row)
+
+    return getter
+
+
+def make_many_getter(name, pk_key):
+    return lambda row, instance, related: related[name].get(row[pk_key], [])
+
+
+class ValuesNode:
+    """
+    Renders one serializer level from a values() row. Keys of the level's
+    columns in the row start with ``prefix``, the join path from the root.
+    """
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix = prefix
+        self.db = model._default_manager.db
+        self.columns = [f"{prefix}{model._meta.pk.attname}"]
+        self.getters = []
+        self.needs_instance = False
+        self.display_related = []
+
+    def add_instance_columns(self):
+        if self.needs_instance:
+            return
+        self.needs_instance = True
+        self.attnames = [f.attname for f in self.model._meta.concrete_fields]
+        self.keys = [f"{self.prefix}{name}" for name in self.attnames]
+        self.columns.extend(self.keys)
+        for name in get_display_related(self.model):
+            field = self.model._meta.get_field(name)
+            related_fields = field.related_model._meta.concrete_fields
+            attnames = [f.attname for f in related_fields]
+            keys = [f"{self.prefix}{name}__{attname}" for attname in attnames]
+            self.columns.extend(keys)
+            self.display_related.append(
+                (field, attnames, keys, f"{self.prefix}{field.attname}")
+            )
+
+    def make_instance(self, row):
+        # Only the columns __str__ and the display methods may read, so no
+        # attribute access falls back to a query.
+        instance = self.model.from_db(
+            self.db, self.attnames, [row[key] for key in self.keys]
+        )
+        for field, attnames, keys, key in self.display_related:
+            related = None
+            if row[key] is not None:
+                related = field.related_model.from_db(
+                    self.db, attnames, [row[k] for k in keys]
+                )
+            field.set_cached_value(instance, related)
+        return instance
+
+    def render(self, row, related=None):
+        instance = self.make_instance(row) if self.needs_instance else None
+        return {name: getter(row, instance, related) for name, getter in self.getters}
+
+
+class ManyValues:
+    """A forward many-to-many field, loaded for a whole page at once."""
+
+    def __init__(self, name, model_field, child):
+        self.name = name
+        self.model_field = model_field
+        # A ValuesNode, or None for a list of primary keys.
+        self.child = child
+
+    def get_ordering(self):
+        target = self.model_field.m2m_reverse_field_name()
+        ordering = []
+        for item in self.model_field.related_model._meta.ordering:
+            if not isinstance(item, str):
+                continue
+            descending = item.startswith("-")
+            ordering.append(f"{'-' if descending else ''}{target}__{item.lstrip('-')}")
+        return [*ordering, "pk"]
+
+    def load(self, pks, using):
+        through = self.model_field.remote_field.through
+        source = through._meta.get_field(self.model_field.m2m_field_name()).attname
+        target = through._meta.get_field(
+            self.model_field.m2m_reverse_field_name()
+        ).attname
+        links = list(
+            through._base_manager.using(using)
+            .filter(**{f"{source}__in": pks})
+            .order_by(*self.get_ordering())
+            .values_list(source, target)
+        )
+        if self.child is None:
+            items = {pk: pk for _, pk in links}
+        else:
+            related_model = self.model_field.related_model
+            rows = (
+                related_model._default_manager.using(using)
+                .filter(pk__in={pk for _, pk in links})
+                .values(*dict.fromkeys(self.child.columns))
+            )
+            key = self.child.columns[0]
+            items = {row[key]: self.child.render(row) for row in rows}
+
+        related = {}
+        for parent, pk in links:
+            if pk in items:
+                related.setdefault(parent, []).append(items[pk])
+        return related
+
+
+class ValuesPlan:
+    """
+    A serializer compiled into a values() query and per-column getters.
+    ``render`` turns the fetched rows into the dicts the serializer would
+    produce without DRF field serialization. Model instances are only built
+    (from the row, without a query) for display_name, module and url.
+    """
+
+    def __init__(self, root, many, prev_next):
+        self.root = root
+        self.many = many
+        self.prev_next = prev_next
+        self.columns = tuple(dict.fromkeys(root.columns))
+
+    def values(self, queryset, extra=()):
+        if self.prev_next and "_previous_id" not in queryset.query.annotations:
+            queryset = PrevNextMixin.annotate_prev_next(queryset)
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys([*self.columns, *extra])
+        )
+
+    def render(self, rows, using):
+        rows = list(rows)
+        pk_key = self.root.columns[0]
+        pks = [row[pk_key] for row in rows]
+        related = {many.name: many.load(pks, using) for many in self.many}
+        return [self.root.render(row, related) for row in rows]
+
+
+class ValuesCompiler:
+    """
+    Compiles read serializers into ValuesPlans, cached like query plans.
+    Serializers with fields the values path cannot reproduce exactly
+    compile to None, and the view keeps the regular path.
+    """
+
+    def __init__(self):
+        self._plans = {}
+
+    def get_plan(self, serializer_class, model, request=None):
+        selection = get_field_selection(request)
+        key = (serializer_class, model, selection)
+        if key not in self._plans:
+            if len(self._plans) >= QUERY_PLAN_CACHE_SIZE:
+                self._plans.clear()
+            context = {"request": request} if selection is not None else {}
+            try:
+                plan = self.build_plan(serializer_class(context=context), model)
+            except Unsupported:
+                plan = None
+            self._plans[key] = plan
+        return self._plans[key]
+
+    def build_plan(self, serializer, model):
+        many = []
+        root = self.compile(serializer, model, "", many)
+        prev_next = any(
+            key in root.columns for key in ANNOTATION_METHOD_FIELDS.values()
+        )
+        return ValuesPlan(root, many, prev_next)
+
+    def compile(self, serializer, model, prefix, many=None):
+        if (
+            type(serializer).to_representation
+            is not serializers.Serializer.to_representation
+        ):
+            raise Unsupported
+        node = ValuesNode(model, prefix)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            node.getters.append(
+                (name, self.compile_field(node, serializer, name, field, many))
+            )
+        return node
+
+    def compile_field(self, node, serializer, name, field, many):
+        model = node.model
+        if isinstance(field, serializers.SerializerMethodField):
+            if name in INSTANCE_METHOD_FIELDS and field.method_name == f"get_{name}":
+                node.add_instance_columns()
+                return make_method_getter(getattr(serializer, field.method_name))
+            if (
+                many is not None
+                and name in ANNOTATION_METHOD_FIELDS
+                and isinstance(serializer, PrevNextMixin)
+            ):
+                key = ANNOTATION_METHOD_FIELDS[name]
+                node.columns.append(key)
+                return make_column_getter(key, None)
+            raise Unsupported
+
+        if field.source == "*" or "." in field.source:
+            raise Unsupported
+        try:
+            model_field = (
+                model._meta.pk
+                if field.source == "pk"
+                else model._meta.get_field(field.source)
+            )
+        except FieldDoesNotExist:
+            raise Unsupported
+
+        if isinstance(
+            field, (serializers.ListSerializer, serializers.ManyRelatedField)
+        ):
+            # Many-to-many fields are only loaded for the top-level rows.
+            if many is None or model_field not in model._meta.many_to_many:
+                raise Unsupported
+            if isinstance(field, serializers.ListSerializer):
+                child = self.compile(field.child, model_field.related_model, "")
+            elif self.is_pk_relation(field.child_relation):
+                child = None
+            else:
+                raise Unsupported
+            many.append(ManyValues(name, model_field, child))
+            return make_many_getter(name, node.columns[0])
+
+        forward = model_field.concrete and (
+            model_field.many_to_one or model_field.one_to_one
+        )
+        key = f"{node.prefix}{model_field.attname}"
+        if isinstance(field, serializers.BaseSerializer):
+            if not forward:
+                raise Unsupported
+            nested = self.compile(
+                field, model_field.related_model, f"{node.prefix}{model_field.name}__"
+            )
+            node.columns.append(key)
+            node.columns.extend(nested.columns)
+            return make_nested_getter(key, nested)
+        if self.is_pk_relation(field):
+            if not forward:
+                raise Unsupported
+            node.columns.append(key)
+            return make_column_getter(key, None)
+        if (
+            isinstance(field, CONVERTED_FIELDS)
+            and model_field.concrete
+            and not model_field.is_relation
+        ):
+            node.columns.append(key)
+            return make_column_getter(key, get_converter(field, model_field))
+        raise Unsupported
+
+    def is_pk_relation(self, field):
+        return (
+            type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None
+        )
+
+
+values_compiler = ValuesCompiler()
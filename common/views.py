@@ -1,38 +1,135 @@
+from functools import partial
+
+from common.cache import (
+    get_cached_response_data,
+    get_model_versions,
+    get_normalized_params,
+    get_response_cache_key,
+    is_response_cache_enabled,
+    is_shared_cache,
+    make_etag,
+    set_cached_response_data,
+)
 from common.mixins import FiltersetMixin, MassActionMixin
-from django.contrib.contenttypes.fields import GenericForeignKey
-from django.db import models
+from common.permissions import get_permission_scope
+from common.planner import query_planner
+from common.registry import model_registry
+from common.renderers import IncrementalJSONRenderer
+from common.values import values_compiler
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import viewsets
+from rest_framework.permissions import SAFE_METHODS, BasePermission
 from rest_framework.response import Response
 
+VALUES_FAST_PATH = getattr(settings, "VALUES_FAST_PATH", False)
+
 
 class BaseModelViewSet(viewsets.ModelViewSet, MassActionMixin, FiltersetMixin):
     # filterset_fields = "__all__"
     ordering_fields = "__all__"
+    # Responses are cached per permission scope. Views whose querysets or
+    # serializers depend on the requesting user should set
+    # response_cache_per_user (or disable response_cache).
+    response_cache = True
+    response_cache_per_user = False
+    # Serve list() from values() rows when the serializer compiles to a
+    # values plan (see common.values); other serializers are unaffected.
+    values_fast_path = VALUES_FAST_PATH
 
     @property
     def search_fields(self):
-        model = self.queryset.model
-        field_Types = [
-            'CharField', 'TextField', 'EmailField', 'SlugField', 'UUIDField'
-        ]
-        return [
-            f.name for f in model._meta.get_fields()
-            if f.get_internal_type() in field_Types
-        ]
-        
+        return model_registry.get(self.queryset.model).search_fields
+
     @property
     def filterset_fields(self):
-        model = self.queryset.model
-        return [
-            f.name for f in model._meta.get_fields()
-            if isinstance(f, models.Field) and 
-            not f.many_to_many and 
-            not f.one_to_many and 
-            not isinstance(f, models.JSONField)
-        ]
-        
-        
+        return model_registry.get(self.queryset.model).filterset_fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plan = query_planner.get_plan(
+            self.get_serializer_class(), queryset.model, self.request
+        )
+        return plan.apply(queryset)
+
+    def list(self, request, *args, **kwargs):
+        handler = super().list
+        if self.get_values_plan() is not None:
+            handler = self.list_values
+        return self.conditional_response(
+            request,
+            partial(self.get_list_validators, request),
+            self.cached_response,
+            handler,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def list_values(self, request, *args, **kwargs):
+        """
+        list() through the values plan: rows go straight from the cursor
+        into dicts, with the same output as the serializer.
+        """
+        plan = self.get_values_plan()
+        queryset = self.filter_queryset(self.get_queryset())
+        extra = ()
+        if hasattr(self.paginator, "get_cursor_ordering"):
+            extra = [name for name, _ in self.paginator.get_cursor_ordering(queryset)]
+        rows = plan.values(queryset, extra)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page, queryset.db))
+        return Response(plan.render(rows, queryset.db))
+
+    def get_values_plan(self):
+        if not self.values_fast_path or self.request.method not in SAFE_METHODS:
+            return None
+        return values_compiler.get_plan(
+            self.get_serializer_class(), self.queryset.model, self.request
+        )
+
     def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_detail_validators,
+            self.cached_response,
+            self.retrieve_with_schema,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = self.check_write_preconditions(request)
+            if response is not None:
+                return response
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = self.check_write_preconditions(request)
+            if response is not None:
+                return response
+            return super().destroy(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        renderer = getattr(response, "accepted_renderer", None)
+        if isinstance(response, Response) and isinstance(
+            renderer, IncrementalJSONRenderer
+        ):
+            if renderer.should_stream(
+                response.data, response.accepted_media_type, response.renderer_context
+            ):
+                return renderer.stream_response(response, request)
+        return response
+
+    def retrieve_with_schema(self, request, *args, **kwargs):
         response = super().retrieve(request, *args, **kwargs)
         metadata = self.get_model_schema()
         return Response(
@@ -43,36 +140,116 @@ class BaseModelViewSet(viewsets.ModelViewSet, MassActionMixin, FiltersetMixin):
         )
 
     def get_model_schema(self):
+        return model_registry.get(self.queryset.model).schema
+
+    def conditional_response(self, request, get_validators, handler, *args, **kwargs):
+        """
+        Answers If-None-Match/If-Modified-Since (304) and If-Match (412)
+        before ``handler`` runs, so matching requests skip the queryset and
+        serialization entirely. Fresh responses carry the validators.
+        """
+        if not self.has_validators():
+            return handler(*args, **kwargs)
+        etag, last_modified = get_validators()
+        timestamp = last_modified.timestamp() if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return response
+        response = handler(*args, **kwargs)
+        if response.status_code == 200:
+            if etag:
+                response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def has_validators(self):
+        # ETags carry model versions, which only reach every process through
+        # a shared cache; otherwise no validators are sent or checked.
+        return is_shared_cache()
+
+    def has_updated_at(self):
+        return "updated_at" in model_registry.get(self.queryset.model).field_names
+
+    def get_versions(self):
+        """
+        Versions of the model and of the other models the serializer
+        renders. Bulk writes bump the version without touching updated_at.
+        """
+        plan = query_planner.get_plan(self.get_serializer_class(), self.queryset.model)
+        return get_model_versions(plan.models)
+
+    def get_list_validators(self, request):
+        """
+        ETag from the normalised query params and the model versions, which
+        every write bumps, so answering a conditional list costs no query.
+        Lists send no Last-Modified, since a deletion would not move it.
+        """
+        label = self.queryset.model._meta.label_lower
+        params = get_normalized_params(request)
+        return make_etag(label, params, self.get_versions()), None
+
+    def get_detail_validators(self, for_update=False):
+        """
+        ETag from the object's pk, updated_at and the model versions;
+        Last-Modified from updated_at.
+        """
         model = self.queryset.model
-        schema = {
-            "title": f"{model.__name__} schema",
-            "description": f"Schema for {model.__name__}",
-            "type": "object",
-            "properties": {},
-            "required": [],
-        }
-        for field in model._meta.get_fields():
-            if isinstance(field, (models.ManyToOneRel, models.ManyToManyRel)):
-                continue
-
-            if isinstance(field, GenericForeignKey):
-                continue
-
-            field_info = {
-                "title": field.verbose_name.title(),
-                "type": field.get_internal_type(),
-                "nullable": getattr(field, "null", False),
-                "blank": getattr(field, "blank", False),
-            }
+        label = model._meta.label_lower
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = self.kwargs.get(lookup_url_kwarg)
+        if not self.has_updated_at():
+            return make_etag(label, lookup, self.get_versions()), None
+
+        queryset = self.queryset.filter(**{self.lookup_field: lookup})
+        if for_update:
+            queryset = queryset.select_for_update()
+        row = queryset.values_list("pk", "updated_at").first()
+        if row is None:
+            return None, None
+        pk, updated_at = row
+        return make_etag(label, pk, updated_at, self.get_versions()), updated_at
 
-            if not field.null and not field.blank and not field.primary_key:
-                schema["required"].append(field.name)
+    def check_write_preconditions(self, request):
+        """
+        Honours If-Match/If-Unmodified-Since on writes. The row is locked
+        while the validators are compared, so a concurrent writer cannot
+        slip in between the check and the update.
+        """
+        if not self.has_validators() or not (
+            request.META.get("HTTP_IF_MATCH")
+            or request.META.get("HTTP_IF_UNMODIFIED_SINCE")
+        ):
+            return None
+        etag, last_modified = self.get_detail_validators(for_update=True)
+        timestamp = last_modified.timestamp() if last_modified else None
+        return get_conditional_response(request, etag=etag, last_modified=timestamp)
 
-            if field.primary_key:
-                field_info["type"] = "string"
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        if key is not None:
+            data = get_cached_response_data(key)
+            if data is not None:
+                return Response(data)
+        response = handler(request, *args, **kwargs)
+        if key is not None and response.status_code == 200:
+            set_cached_response_data(key, response.data)
+        return response
 
-            schema["properties"][field.name] = field_info
+    def get_response_cache_key(self, request):
+        if not (self.response_cache and is_response_cache_enabled()):
+            return None
+        plan = query_planner.get_plan(self.get_serializer_class(), self.queryset.model)
+        scope = get_permission_scope(request.user)
+        if self.response_cache_per_user or self.has_object_permissions():
+            scope.append(request.user.pk)
+        return get_response_cache_key(request, self.action, plan.models, scope)
 
-        return schema
-        return schema
-        return schema
+    def has_object_permissions(self):
+        # A cached retrieve skips get_object(), and with it any object-level
+        # permission check, so such views are cached per user.
+        return self.action == "retrieve" and any(
+            type(permission).has_object_permission
+            is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
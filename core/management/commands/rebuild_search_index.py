@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from tqdm import tqdm
+
+from common.search import (
+    SEARCH_INDEX_BATCH_SIZE,
+    get_search_backend,
+    get_search_models,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the global search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--module",
+            type=str,
+            choices=[model.__name__ for model in get_search_models()],
+            help="Only rebuild the index for this model (e.g., 'User')",
+        )
+
+    def handle(self, *args, **options):
+        module = options.get("module")
+        backend = get_search_backend()
+        try:
+            for model in get_search_models():
+                if module is not None and model.__name__ != module:
+                    continue
+                backend.clear(model)
+                batch = []
+                with tqdm(total=model.objects.count()) as bar:
+                    for instance in model.objects.iterator(
+                        chunk_size=SEARCH_INDEX_BATCH_SIZE
+                    ):
+                        batch.append(instance)
+                        if len(batch) >= SEARCH_INDEX_BATCH_SIZE:
+                            backend.index(batch)
+                            bar.update(len(batch))
+                            batch = []
+                    if batch:
+                        backend.index(batch)
+                        bar.update(len(batch))
+                self.stdout.write(f"Successfully! indexed {model.__name__} records")
+        except Exception as error:
+            raise CommandError(str(error))
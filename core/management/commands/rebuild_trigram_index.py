@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from tqdm import tqdm
+
+from common.trigram import TRIGRAM_BATCH_SIZE, get_trigram_backend, get_trigram_models
+
+
+class Command(BaseCommand):
+    help = "Create and rebuild the trigram substring indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--module",
+            type=str,
+            choices=[model.__name__ for model in get_trigram_models()],
+            help="Only rebuild the index for this model (e.g., 'User')",
+        )
+
+    def handle(self, *args, **options):
+        module = options.get("module")
+        backend = get_trigram_backend()
+        try:
+            for model in get_trigram_models():
+                if module is not None and model.__name__ != module:
+                    continue
+                backend.setup(model)
+                backend.clear(model)
+                batch = []
+                with tqdm(total=model.objects.count()) as bar:
+                    for instance in model.objects.iterator(
+                        chunk_size=TRIGRAM_BATCH_SIZE
+                    ):
+                        batch.append(instance)
+                        if len(batch) >= TRIGRAM_BATCH_SIZE:
+                            backend.index(batch)
+                            bar.update(len(batch))
+                            batch = []
+                    if batch:
+                        backend.index(batch)
+                        bar.update(len(batch))
+                self.stdout.write(f"Successfully! indexed {model.__name__} records")
+        except Exception as error:
+            raise CommandError(str(error))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="import",
+            name="key_field",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_import_key_field"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="export",
+            name="exported_rows",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="export",
+            name="total_rows",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:28
+
+from django.db import migrations, models
+
+from common.globals import ALLOWED_VIEWS
+from common.registry import TEXT_SEARCH_FIELD_CLASSES
+
+BATCH_SIZE = 1000
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_searchdocument_fts USING fts5(
+        body, content='core_searchdocument', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, body)
+        VALUES ('delete', old.id, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, body)
+        VALUES ('delete', old.id, old.body);
+        INSERT INTO core_searchdocument_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS core_searchdocument_ai",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS core_searchdocument_au",
+    "DROP TABLE IF EXISTS core_searchdocument_fts",
+]
+
+
+def run_sqlite(statements):
+    # The FTS5 shadow table only exists on SQLite; other databases search
+    # the document table through their own backend.
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for sql in statements:
+                schema_editor.execute(sql)
+
+    return run
+
+
+def index_documents(apps, schema_editor):
+    # Rows saved before this migration never went through the post_save
+    # indexing, so build their documents here; the insert trigger fills
+    # the FTS5 table from them.
+    SearchDocument = apps.get_model("core", "SearchDocument")
+    db_alias = schema_editor.connection.alias
+    for model in apps.get_models():
+        if model.__name__ not in ALLOWED_VIEWS:
+            continue
+        names = [
+            f.name
+            for f in model._meta.fields
+            if isinstance(f, TEXT_SEARCH_FIELD_CLASSES)
+        ]
+        batch = []
+        for instance in model._base_manager.using(db_alias).iterator(
+            chunk_size=BATCH_SIZE
+        ):
+            values = (getattr(instance, name) for name in names)
+            batch.append(
+                SearchDocument(
+                    model=model._meta.label_lower,
+                    object_id=str(instance.pk),
+                    body=" ".join(
+                        str(value) for value in values if value not in (None, "")
+                    ),
+                )
+            )
+            if len(batch) >= BATCH_SIZE:
+                SearchDocument.objects.using(db_alias).bulk_create(batch)
+                batch = []
+        SearchDocument.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_export_progress"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("object_id", models.CharField(max_length=64)),
+                ("body", models.TextField()),
+            ],
+            options={
+                "unique_together": {("model", "object_id")},
+            },
+        ),
+        migrations.RunPython(run_sqlite(FTS_SQL), run_sqlite(DROP_FTS_SQL)),
+        migrations.RunPython(index_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_trigramdocument_fts USING fts5(
+        value, content='core_trigramdocument', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER core_trigramdocument_ai AFTER INSERT ON core_trigramdocument BEGIN
+        INSERT INTO core_trigramdocument_fts(rowid, value) VALUES (new.id, new.value);
+    END
+    """,
+    """
+    CREATE TRIGGER core_trigramdocument_ad AFTER DELETE ON core_trigramdocument BEGIN
+        INSERT INTO core_trigramdocument_fts(core_trigramdocument_fts, rowid, value)
+        VALUES ('delete', old.id, old.value);
+    END
+    """,
+    """
+    CREATE TRIGGER core_trigramdocument_au AFTER UPDATE ON core_trigramdocument BEGIN
+        INSERT INTO core_trigramdocument_fts(core_trigramdocument_fts, rowid, value)
+        VALUES ('delete', old.id, old.value);
+        INSERT INTO core_trigramdocument_fts(rowid, value) VALUES (new.id, new.value);
+    END
+    """,
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS core_trigramdocument_ai",
+    "DROP TRIGGER IF EXISTS core_trigramdocument_ad",
+    "DROP TRIGGER IF EXISTS core_trigramdocument_au",
+    "DROP TABLE IF EXISTS core_trigramdocument_fts",
+]
+
+
+def run_sqlite(statements):
+    # The trigram FTS5 table only exists on SQLite; PostgreSQL indexes the
+    # columns themselves with pg_trgm.
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for sql in statements:
+                schema_editor.execute(sql)
+
+    return run
+
+
+def index_documents(apps, schema_editor):
+    # Index the rows that already exist for the configured fields; the insert
+    # trigger fills the FTS5 table from them. Fields added to TRIGRAM_FIELDS
+    # later still need `manage.py rebuild_trigram_index`.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    TrigramDocument = apps.get_model("core", "TrigramDocument")
+    db_alias = schema_editor.connection.alias
+    for label, names in getattr(settings, "TRIGRAM_FIELDS", {}).items():
+        model = apps.get_model(label)
+        batch = []
+        for instance in model._base_manager.using(db_alias).iterator(
+            chunk_size=BATCH_SIZE
+        ):
+            for name in names:
+                value = getattr(instance, name)
+                batch.append(
+                    TrigramDocument(
+                        model=label,
+                        field=name,
+                        object_id=str(instance.pk),
+                        value="" if value is None else str(value),
+                    )
+                )
+            if len(batch) >= BATCH_SIZE:
+                TrigramDocument.objects.using(db_alias).bulk_create(batch)
+                batch = []
+        TrigramDocument.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrigramDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("field", models.CharField(max_length=100)),
+                ("object_id", models.CharField(max_length=64)),
+                ("value", models.TextField()),
+            ],
+            options={
+                "unique_together": {("model", "field", "object_id")},
+            },
+        ),
+        migrations.RunPython(run_sqlite(FTS_SQL), run_sqlite(DROP_FTS_SQL)),
+        migrations.RunPython(index_documents, migrations.RunPython.noop),
+    ]
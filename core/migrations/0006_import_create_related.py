@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_trigram_document"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="import",
+            name="create_related",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
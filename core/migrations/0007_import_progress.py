@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_import_create_related"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="import",
+            name="error_rows",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="import",
+            name="imported_rows",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="import",
+            name="total_rows",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
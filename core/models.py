@@ -13,6 +13,8 @@ class Export(BaseModel):
     conditions = models.JSONField()
     file = models.FileField(upload_to="exports", blank=True, null=True)
     task_id = models.UUIDField(blank=True, null=True, unique=True)
+    total_rows = models.PositiveIntegerField(default=0)
+    exported_rows = models.PositiveIntegerField(default=0)
 
 
 class Import(BaseModel):
@@ -20,11 +22,35 @@ class Import(BaseModel):
     model = models.CharField(max_length=100)
     app_label = models.CharField(max_length=100)
     action = models.CharField(max_length=100, default="create")
+    key_field = models.CharField(max_length=100, blank=True, null=True)
     columns = models.JSONField()
     mappings = models.JSONField()
     default_values = models.JSONField(blank=True, null=True)
+    create_related = models.JSONField(blank=True, null=True)
     conditions = models.JSONField(blank=True, null=True)
     rows = models.JSONField(blank=True, null=True)
     file = models.FileField(upload_to="imports", blank=True, null=True)
     results = models.FileField(upload_to="imports/results", blank=True, null=True)
     task_id = models.UUIDField(blank=True, null=True, unique=True)
+    total_rows = models.PositiveIntegerField(default=0)
+    imported_rows = models.PositiveIntegerField(default=0)
+    error_rows = models.PositiveIntegerField(default=0)
+
+
+class SearchDocument(models.Model):
+    model = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    body = models.TextField()
+
+    class Meta:
+        unique_together = ("model", "object_id")
+
+
+class TrigramDocument(models.Model):
+    model = models.CharField(max_length=100)
+    field = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    value = models.TextField()
+
+    class Meta:
+        unique_together = ("model", "field", "object_id")
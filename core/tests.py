@@ -1,3 +1,215 @@
-from django.test import TestCase
+import pandas as pd
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+from common.cache import bump_model_version
+from common.importer import BulkImporter
+from common.search import search_model
+from common.trigram import get_trigram_backend
+from common.tests import SharedCacheMixin
+from core.models import Export
+from core.views import ExportViewSet, GlobalSearchView
+from djauth.models import User
+
+
+class ConditionalRequestTests(SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user("etag@x.com", "secret", username="etag")
+        self.export = Export.objects.create(
+            name="original", model="user", app_label="djauth", columns=[], conditions=[]
+        )
+
+    def detail(self, method="get", data=None, **headers):
+        view = ExportViewSet.as_view({"get": "retrieve", "put": "update"})
+        request = getattr(self.factory, method)(
+            f"/exports/{self.export.pk}/", data, format="json", **headers
+        )
+        force_authenticate(request, self.user)
+        return view(request, pk=self.export.pk)
+
+    def list(self, **headers):
+        view = ExportViewSet.as_view({"get": "list"})
+        return view(self.factory.get("/exports/", **headers))
+
+    def bulk_rename(self, name):
+        # Queryset updates leave updated_at alone and only bump the version.
+        with self.captureOnCommitCallbacks(execute=True):
+            Export.objects.filter(pk=self.export.pk).update(name=name)
+            bump_model_version(Export)
+
+    def test_unchanged_rows_are_not_modified(self):
+        etag = self.detail()["ETag"]
+        self.assertEqual(self.detail(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        etag = self.list()["ETag"]
+        self.assertEqual(self.list(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_conditional_list_runs_no_query(self):
+        etag = self.list()["ETag"]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.list(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_saves_and_deletes_change_list_etags(self):
+        etag = self.list()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.export.name = "saved"
+            self.export.save()
+        saved = self.list(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(saved.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.export.delete()
+        self.assertEqual(self.list(HTTP_IF_NONE_MATCH=saved["ETag"]).status_code, 200)
+
+    def test_bulk_write_changes_etags(self):
+        detail_etag = self.detail()["ETag"]
+        list_etag = self.list()["ETag"]
+        self.bulk_rename("bulk")
+
+        response = self.detail(HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["name"], "bulk")
+        self.assertEqual(self.list(HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_import_changes_etags(self):
+        etag = self.detail()["ETag"]
+        importer = BulkImporter(Export, {"id": "ID", "name": "Name"}, [], "id")
+        df = pd.DataFrame({"ID": [str(self.export.pk)], "Name": ["imported"]})
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.upsert_chunk(df, 1)
+
+        self.assertEqual(self.detail(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.detail()["ETag"]
+        self.bulk_rename("bulk")
+
+        response = self.detail("put", {"name": "overwrite"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.export.refresh_from_db()
+        self.assertEqual(self.export.name, "bulk")
+
+    def test_current_if_match_is_accepted(self):
+        etag = self.detail()["ETag"]
+        data = {
+            "name": "edited",
+            "model": "user",
+            "app_label": "djauth",
+            "columns": [],
+            "conditions": [],
+        }
+        response = self.detail("put", data, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.export.refresh_from_db()
+        self.assertEqual(self.export.name, "edited")
+
+
+class LocalCacheConditionalRequestTests(TestCase):
+    def test_no_validators_without_a_shared_cache(self):
+        export = Export.objects.create(
+            name="local", model="user", app_label="djauth", columns=[], conditions=[]
+        )
+        view = ExportViewSet.as_view({"get": "retrieve"})
+        response = view(APIRequestFactory().get("/"), pk=export.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+
+def search_names(query):
+    hits, _ = search_model(query, User, 10)
+    return [hit["display_name"] for hit in hits]
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user(
+            "annabel@x.com", "secret", username="annabel", first_name="Annabel"
+        )
+        User.objects.create_user(
+            "nabil@x.com", "secret", username="nabil", first_name="Nabil"
+        )
+
+    def test_prefix_matches_rank_first(self):
+        self.assertEqual(search_names("nab"), ["Nabil", "Annabel"])
+
+    def test_substring_matches(self):
+        self.assertEqual(search_names("nnabe"), ["Annabel"])
+        # Terms may match different trigram fields.
+        self.assertEqual(search_names("bel com"), ["Annabel"])
+        self.assertEqual(search_names("nobody"), [])
+
+    def test_short_terms_only_match_prefixes(self):
+        # Shorter than a trigram, so the substring index cannot answer it.
+        self.assertEqual(search_names("na"), ["Nabil"])
+
+    def test_substring_matches_use_the_trigram_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            search_names("nnabe")
+        self.assertIn("core_trigramdocument_fts MATCH", queries[0]["sql"])
+        self.assertNotIn("LIKE", queries[0]["sql"])
+
+
+class GlobalSearchViewTests(TransactionTestCase):
+    # Models are searched in worker threads, which only see committed rows.
+    def test_results_keep_the_schema(self):
+        user = User.objects.create_user(
+            "annabel@x.com", "secret", username="annabel", first_name="Annabel"
+        )
+        request = APIRequestFactory().get("/search/", {"q": "annabel"})
+        response = GlobalSearchView.as_view({"get": "list"})(request)
+
+        self.assertEqual(response.status_code, 200)
+        result = response.data["User"]
+        self.assertEqual(
+            result["data"],
+            [{"id": user.pk, "display_name": "Annabel", "matched_field": "username"}],
+        )
+        self.assertEqual(
+            [column["name"] for column in result["schema"]],
+            [f.name for f in User._meta.fields],
+        )
+        self.assertEqual(
+            result["schema"][0],
+            {"name": "id", "type": "BigAutoField", "null": False, "primary_key": True},
+        )
+
+
+class IndexBackfillMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("core", target)])
+        return executor.loader.project_state([("core", target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def create_user(self, apps):
+        apps.get_model("djauth", "User").objects.create(
+            email="annabel@x.com", username="annabel", first_name="Annabel"
+        )
+
+    def test_existing_rows_are_searchable(self):
+        self.create_user(self.migrate("0003_export_progress"))
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        self.assertEqual(search_names("annabel"), ["Annabel"])
+        self.assertEqual(search_names("nab"), ["Annabel"])
+
+    def test_existing_rows_are_trigram_indexed(self):
+        self.create_user(self.migrate("0004_search_document"))
+        self.migrate("0005_trigram_document")
+
+        match = get_trigram_backend().match(User, "first_name", "nnab")
+        self.assertIsNotNone(match)
+        self.assertEqual(
+            list(User.objects.filter(match).values_list("first_name", flat=True)),
+            ["Annabel"],
+        )
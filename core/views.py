@@ -1,17 +1,22 @@
-from django.apps import apps
-from django.db import models as models1
-from django.db.models import Q
+import base64
+import json
+
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from rest_framework.serializers import ModelSerializer
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ViewSet
 
-from common.globals import ALLOWED_VIEWS
 from common.mixins import PaginationMixin
-from common.serializers import BaseSerializer
+from common.search import (
+    SEARCH_MAX_RESULTS_PER_MODEL,
+    SEARCH_RESULTS_PER_MODEL,
+    get_search_models,
+    search_all,
+)
 from common.views import BaseModelViewSet
 from core import models, serializers
 
@@ -36,6 +41,7 @@ class ImportViewSet(BaseModelViewSet):
 
 class GlobalSearchView(ViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    cursor_query_param = "cursor"
 
     def list(self, request):
         q = request.query_params.get("q")
@@ -45,63 +51,81 @@ class GlobalSearchView(ViewSet):
                 {"detail": "Query param `q` is required."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        results = {}
-        all_models = apps.get_models()
-        for model in all_models:
+        try:
+            limit = int(request.query_params.get("limit", SEARCH_RESULTS_PER_MODEL))
+        except ValueError:
+            limit = SEARCH_RESULTS_PER_MODEL
+        limit = max(1, min(limit, SEARCH_MAX_RESULTS_PER_MODEL))
 
-            if model.__name__ not in ALLOWED_VIEWS:
-                continue
+        offset = 0
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            if module is None:
+                return Response(
+                    {"detail": "Query param `cursor` requires `module`."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            offset = self.decode_cursor(cursor)
 
-            if module is not None and model.__name__ != module:
+        search_models = [
+            model
+            for model in get_search_models()
+            if module is None or model.__name__ == module
+        ]
+        results = {}
+        for model, found in search_all(q, search_models, limit, offset).items():
+            if found is None:
+                results[model.__name__] = {
+                    "data": [],
+                    "schema": self.get_schema(model),
+                    "next": None,
+                    "timed_out": True,
+                }
+                continue
+            hits, has_more = found
+            if not hits and not has_more:
                 continue
+            results[model.__name__] = {
+                "data": hits,
+                "schema": self.get_schema(model),
+                "next": (
+                    self.get_next_link(request, model, offset + limit)
+                    if has_more
+                    else None
+                ),
+                "timed_out": False,
+            }
+        return Response(results, status=status.HTTP_200_OK)
 
-            search_fields = [
-                f.name
-                for f in model._meta.fields
-                if isinstance(
-                    f,
-                    (
-                        models1.CharField,
-                        models1.TextField,
-                        models1.EmailField,
-                        models1.URLField,
-                        models1.SlugField,
-                        models1.DateField,
-                        models1.DateTimeField,
-                        models1.TimeField,
-                        models1.BigAutoField,
-                    ),
-                )
-            ]
+    def get_schema(self, model):
+        return [
+            {
+                "name": f.name,
+                "type": f.get_internal_type(),
+                "null": getattr(f, "null", False),
+                "primary_key": getattr(f, "primary_key", False),
+            }
+            for f in model._meta.fields
+        ]
 
-            if not search_fields:
-                continue
+    def get_next_link(self, request, model, offset):
+        url = replace_query_param(
+            request.build_absolute_uri(), "module", model.__name__
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(offset)
+        )
 
-            query = Q()
-            for field in search_fields:
-                query |= Q(**{f"{field}__icontains": q})
+    def encode_cursor(self, offset):
+        payload = json.dumps({"o": offset}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
 
-            qs = model.objects.filter(query)
-            if qs.exists():
-                TempSerializer = type(
-                    f"{model.__name__}Serializer",
-                    (BaseSerializer, ModelSerializer),
-                    {
-                        "Meta": type("Meta", (), {"model": model, "fields": "__all__"}),
-                    },
-                )
-                serialized_data = TempSerializer(qs, many=True).data
-                schema = [
-                    {
-                        "name": f.name,
-                        "type": f.get_internal_type(),
-                        "null": getattr(f, "null", False),
-                        "primary_key": getattr(f, "primary_key", False),
-                    }
-                    for f in model._meta.fields
-                ]
-                results[model.__name__] = {
-                    "data": serialized_data,
-                    "schema": schema,
-                }
-        return Response(results, status=status.HTTP_200_OK)
+    def decode_cursor(self, token):
+        try:
+            payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            offset = json.loads(payload)["o"]
+            if not isinstance(offset, int) or offset < 0:
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound("Invalid cursor")
+        return offset
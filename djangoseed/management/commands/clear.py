@@ -2,6 +2,8 @@ from django.apps import apps
 from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
+from common.deletion import BulkDeleter
+
 
 class Command(BaseCommand):
     help = "Delete all data for the given module."
@@ -27,12 +29,17 @@ class Command(BaseCommand):
         module = options.get("module")
         try:
             model = apps.get_model(app, module)
-            records = model.objects.all()
-            for record in tqdm(records):
-                record.delete()
+            with tqdm(total=model.objects.count()) as bar:
+                result = BulkDeleter(model).delete_queryset(
+                    model.objects.all(), on_progress=bar.update
+                )
             self.stdout.write(
-                f"Successfully! deleted {len(records)} {model.__name__} records"
+                f"Successfully! deleted {result['deleted']} {model.__name__} records"
             )
+            if result["protected"]:
+                self.stderr.write(
+                    f"Skipped {len(result['protected'])} protected records."
+                )
         except LookupError:
             self.stderr.write(f"Model '{module}' does not exist in '{app}'.")
         except Exception as error:
@@ -47,6 +47,8 @@ class User(AbstractUser, PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
     EXCLUDE_FIELDS = ["username"]
+    # Read by __str__ (see common.planner).
+    DISPLAY_FIELDS = ["first_name", "last_name", "email"]
 
     def __str__(self):
         if self.first_name or self.last_name:
@@ -1,3 +1,69 @@
+from django.contrib.auth.models import Group, Permission
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory
 
-# Create your tests here.
+from common.permissions import GroupRolePermission, get_permission_generation
+from common.tests import SharedCacheMixin
+from djauth.models import User
+from djauth.views import UserViewSet
+
+
+class PermissionRevocationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.permission = Permission.objects.get(codename="view_user")
+        self.group = Group.objects.create(name="viewers")
+        self.group.permissions.add(self.permission)
+        self.user = User.objects.create_user("perm@x.com", "secret", username="perm")
+        self.user.groups.add(self.group)
+
+    def can_view(self):
+        # A fresh user, as each request loads one.
+        request = APIRequestFactory().get("/users/")
+        request.user = User.objects.get(pk=self.user.pk)
+        return GroupRolePermission().has_permission(request, UserViewSet())
+
+    def test_group_permission_revoked(self):
+        self.assertTrue(self.can_view())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.remove(self.permission)
+        self.assertFalse(self.can_view())
+
+    def test_group_membership_revoked(self):
+        self.assertTrue(self.can_view())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.group)
+        self.assertFalse(self.can_view())
+
+    def test_revocation_without_generation_bump(self):
+        # Another process's bump never reaches a process-local cache, so the
+        # compiled sets must not outlive the request there.
+        self.assertTrue(self.can_view())
+        self.group.permissions.through.objects.filter(group=self.group).delete()
+        self.assertFalse(self.can_view())
+
+
+class SharedCachePermissionRevocationTests(SharedCacheMixin, PermissionRevocationTests):
+    def test_revocation_without_generation_bump(self):
+        # A shared cache serves the compiled set until the generation moves.
+        self.assertTrue(self.can_view())
+        self.group.permissions.through.objects.filter(group=self.group).delete()
+        self.assertTrue(self.can_view())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.add(self.permission)
+            self.group.permissions.remove(self.permission)
+        self.assertFalse(self.can_view())
+
+    def test_generation_moves_after_commit(self):
+        # A request reading the still-committed rows before the commit must
+        # not cache them under the new generation.
+        generation = get_permission_generation()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.group.permissions.remove(self.permission)
+            self.assertEqual(get_permission_generation(), generation)
+        self.assertTrue(callbacks)
+        self.assertEqual(get_permission_generation(), generation)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_permission_generation(), generation)
+        self.assertFalse(self.can_view())
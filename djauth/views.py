@@ -30,6 +30,7 @@ class UserViewSet(BaseModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = PaginationMixin
     filter_backends = [DjangoFilterBackend, OrderingFilter]
+    values_fast_path = True
 
 
 class GroupViewSet(BaseModelViewSet):
@@ -38,6 +39,7 @@ class GroupViewSet(BaseModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = PaginationMixin
     filter_backends = [DjangoFilterBackend, OrderingFilter]
+    values_fast_path = True
 
 
 class ContentTypeViewSet(BaseModelViewSet):
@@ -46,6 +48,7 @@ class ContentTypeViewSet(BaseModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = PaginationMixin
     filter_backends = [DjangoFilterBackend, OrderingFilter]
+    values_fast_path = True
     filterset_fields = ["model"]
 
 
@@ -55,6 +58,7 @@ class PermissionViewSet(BaseModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = PaginationMixin
     filter_backends = [DjangoFilterBackend, OrderingFilter]
+    values_fast_path = True
 
 
 class PasswordResetViewSet(viewsets.ViewSet):
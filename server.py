@@ -1,3 +1,4 @@
+import os
 import subprocess
 import sys
 from pathlib import Path
@@ -8,6 +9,11 @@ from watchdog.observers import Observer
 from api.settings import BASE_DIR
 
 venv_python = sys.executable
+# Django and Celery share the Redis started below for caching (see settings).
+env = {
+    **os.environ,
+    "REDIS_URL": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0"),
+}
 
 processes = {
     "django": [str(venv_python), "manage.py", "runserver", "0.0.0.0:8000"],
@@ -20,11 +26,13 @@ processes = {
         "api",
         "worker",
         "--loglevel=info",
-        "--pool=solo",
+        # prefork runs one task per core, so import shards and export
+        # partitions proceed in parallel; it is not available on Windows.
+        "--pool=solo" if sys.platform == "win32" else "--pool=prefork",
     ],
 }
 
-procs = {name: subprocess.Popen(cmd) for name, cmd in processes.items()}
+procs = {name: subprocess.Popen(cmd, env=env) for name, cmd in processes.items()}
 
 
 class ReloadHandler(FileSystemEventHandler):
@@ -33,7 +41,7 @@ class ReloadHandler(FileSystemEventHandler):
             print("🔄 Restarting Celery...")
             procs["celery"].terminate()
             procs["celery"].wait()
-            procs["celery"] = subprocess.Popen(processes["celery"])
+            procs["celery"] = subprocess.Popen(processes["celery"], env=env)
 
 
 observer = Observer()